@@ -0,0 +1,118 @@
+"""Throughput, latency, memory and accuracy of the FP32 and INT8 MiniLM embedding models on CPU.
+
+Usage (from the repo root, after python convert_miniLM_openvino.py):
+    python -m benchmarks.bench_embeddings [model_dir]
+
+Each precision runs in its own process, so peak RSS is that model's alone. Accuracy is
+measured on a small held-out set of labelled sentence pairs that is not used for calibration.
+"""
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import numpy as np
+from utils.plag.embeddings import MODEL_DIR, PARAPHRASE_SIMILARITY, EmbeddingEngine, model_path
+
+BATCH_SIZES = [1, 8, 32, 64]
+SENTENCES_PER_RUN = 512
+# (sentence, sentence, is_paraphrase)
+HELD_OUT_PAIRS = [
+    ("The mitochondria produce most of the cell's energy.", "Most of a cell's energy is generated by its mitochondria.", True),
+    ("Water boils at one hundred degrees Celsius at sea level.", "At sea level, water reaches its boiling point at 100 °C.", True),
+    ("The algorithm sorts the list in ascending order.", "The list is arranged from smallest to largest by the algorithm.", True),
+    ("Democracy gives citizens the power to elect their leaders.", "In a democracy, people choose their representatives by voting.", True),
+    ("Friction opposes the relative motion of two surfaces in contact.", "When two surfaces touch, friction resists their sliding past each other.", True),
+    ("The company's profits rose sharply in the last quarter.", "Profits at the firm increased steeply during the final quarter.", True),
+    ("A compiler translates source code into machine code.", "Source code is converted to machine instructions by a compiler.", True),
+    ("Plants absorb carbon dioxide and release oxygen.", "Oxygen is released by plants as they take in carbon dioxide.", True),
+    ("The treaty ended the war between the two nations.", "The war between the two countries was brought to an end by the treaty.", True),
+    ("Increasing the temperature speeds up most chemical reactions.", "Most reactions proceed faster when the temperature is raised.", True),
+    ("The mitochondria produce most of the cell's energy.", "The treaty ended the war between the two nations.", False),
+    ("Water boils at one hundred degrees Celsius at sea level.", "A compiler translates source code into machine code.", False),
+    ("The algorithm sorts the list in ascending order.", "The algorithm searches the list for a target value.", False),
+    ("Democracy gives citizens the power to elect their leaders.", "Monarchies pass power down through a royal family.", False),
+    ("Friction opposes the relative motion of two surfaces in contact.", "Gravity pulls objects toward the centre of the earth.", False),
+    ("The company's profits rose sharply in the last quarter.", "The company hired a new chief executive last year.", False),
+    ("Plants absorb carbon dioxide and release oxygen.", "Animals inhale oxygen and exhale carbon dioxide.", False),
+    ("Increasing the temperature speeds up most chemical reactions.", "Catalysts are not consumed by the reactions they speed up.", False),
+    ("The poem describes a journey across the desert.", "The novel is set in a small fishing village.", False),
+    ("Students must submit the assignment before Friday.", "The library is closed on public holidays.", False),
+]
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_precision(model_dir, precision):
+    """All measurements for one precision; runs in a fresh process."""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        start = time.perf_counter()
+        EmbeddingEngine(model_dir, precision=precision, cache_dir=cache_dir)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        engine = EmbeddingEngine(model_dir, precision=precision, cache_dir=cache_dir)
+        cached = time.perf_counter() - start
+    pair_sentences = [s for a, b, _ in HELD_OUT_PAIRS for s in (a, b)]
+    sentences = (pair_sentences * (SENTENCES_PER_RUN // len(pair_sentences) + 1))[:SENTENCES_PER_RUN]
+    engine.embed(sentences[:64])  # warm-up
+    batches = {}
+    for batch_size in BATCH_SIZES:
+        latencies = []
+        start = time.perf_counter()
+        for i in range(0, len(sentences), batch_size):
+            batch_start = time.perf_counter()
+            engine.embed(sentences[i:i + batch_size], batch_size=batch_size)
+            latencies.append((time.perf_counter() - batch_start) * 1000)
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        batches[batch_size] = {
+            "sentences_per_sec": len(sentences) / elapsed,
+            "p50_ms": statistics.median(latencies),
+            "p99_ms": latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)],
+        }
+    vectors = engine.embed(pair_sentences)
+    cosines = (vectors[0::2] * vectors[1::2]).sum(axis=1)
+    return {
+        "model": engine.path,
+        "compile_s": cold,
+        "cached_compile_s": cached,
+        "batches": batches,
+        "cosines": cosines.tolist(),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def main(model_dir=MODEL_DIR):
+    precisions = ["fp32"]
+    if model_path(model_dir, "int8") != model_path(model_dir, "fp32"):
+        precisions.append("int8")
+    else:
+        print("No INT8 model found; run convert_miniLM_openvino.py to export one.")
+    results = {}
+    for precision in precisions:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            results[precision] = pool.submit(run_precision, model_dir, precision).result()
+    labels = np.array([same for _, _, same in HELD_OUT_PAIRS])
+    print(f"{'precision':<10}{'batch':>6}{'sent/s':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for precision, result in results.items():
+        for batch_size, stats in result["batches"].items():
+            print(f"{precision:<10}{batch_size:>6}{stats['sentences_per_sec']:>10.1f}{stats['p50_ms']:>9.2f}{stats['p99_ms']:>9.2f}")
+    print()
+    for precision, result in results.items():
+        cosines = np.array(result["cosines"])
+        accuracy = ((cosines >= PARAPHRASE_SIMILARITY) == labels).mean()
+        print(f"{precision}: compile {result['compile_s']:.2f}s (cached {result['cached_compile_s']:.2f}s), "
+              f"peak RSS {result['peak_rss_mb']:.0f} MB, paraphrase accuracy {accuracy:.0%} "
+              f"at cosine >= {PARAPHRASE_SIMILARITY}")
+    if "int8" in results:
+        delta = np.abs(np.array(results["int8"]["cosines"]) - np.array(results["fp32"]["cosines"]))
+        print(f"INT8 vs FP32 cosine delta on held-out pairs: mean {delta.mean():.4f}, max {delta.max():.4f}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,143 @@
+"""Counts JPEG encodes of the size-targeted encoder against the old linear-step loops.
+
+Usage (from the repo root): python -m benchmarks.bench_jpeg_encode [pdf ...]
+
+Pages are rendered with PyMuPDF at pdf2image's default 200 DPI, so no poppler install is needed.
+"""
+import glob
+import io
+import os
+import sys
+import tempfile
+import time
+import pymupdf
+from PIL import Image
+from utils.plag.jpeg_encode import save_jpeg_under_size
+from utils.plag.image_split import split_image_by_size
+
+BUDGETS_MB = [19, 4, 1, 0.25]
+
+
+def legacy_compress_image_to_size(img, output_path, max_size_mb=19, min_quality=30):
+    quality = 95
+    while quality >= min_quality:
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=quality)
+        size_mb = buffer.tell() / (1024 * 1024)
+        if size_mb <= max_size_mb:
+            with open(output_path, "wb") as f:
+                f.write(buffer.getvalue())
+            return output_path
+        quality -= 10
+    width, height = img.size
+    while size_mb > max_size_mb and width > 500:
+        width = int(width * 0.9)
+        height = int(height * 0.9)
+        img = img.resize((width, height), Image.LANCZOS)
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=min_quality)
+        size_mb = buffer.tell() / (1024 * 1024)
+    with open(output_path, "wb") as f:
+        f.write(buffer.getvalue())
+    return output_path
+
+
+def legacy_split_image_by_size(image_path, max_size_mb=19, min_height=200):
+    img = Image.open(image_path)
+    width, height = img.size
+    chunks = []
+    y = 0
+    while y < height:
+        chunk_height = min(2000, height - y)
+        while chunk_height >= min_height:
+            chunk = img.crop((0, y, width, y + chunk_height))
+            buffer = io.BytesIO()
+            chunk.save(buffer, format="JPEG", quality=85)
+            if buffer.tell() / (1024 * 1024) <= max_size_mb:
+                chunk_path = f"{image_path}_chunk_{len(chunks)}.jpg"
+                chunk.save(chunk_path, format="JPEG", quality=85)
+                chunks.append(chunk_path)
+                y += chunk_height
+                break
+            chunk_height = int(chunk_height * 0.8)
+        else:
+            chunk = img.crop((0, y, width, y + min_height))
+            chunk = chunk.resize((width, int(min_height * 0.8)), Image.LANCZOS)
+            chunk_path = f"{image_path}_chunk_{len(chunks)}.jpg"
+            chunk.save(chunk_path, format="JPEG", quality=70)
+            chunks.append(chunk_path)
+            y += min_height
+    return chunks
+
+
+class EncodeCounter:
+    """Counts every PIL JPEG encode while active."""
+
+    def __enter__(self):
+        self.count = 0
+        self._save = Image.Image.save
+        counter = self
+
+        def save(img, fp, format=None, **params):
+            if (format or "").upper() == "JPEG" or str(fp).lower().endswith(".jpg"):
+                counter.count += 1
+            return counter._save(img, fp, format, **params)
+
+        Image.Image.save = save
+        return self
+
+    def __exit__(self, *exc):
+        Image.Image.save = self._save
+
+
+def render_stitched(pdf_path, dpi=200):
+    doc = pymupdf.open(pdf_path)
+    pages = []
+    for page in doc:
+        pix = page.get_pixmap(dpi=dpi)
+        pages.append(Image.frombytes("RGB", (pix.width, pix.height), pix.samples))
+    width = max(p.width for p in pages)
+    stitched = Image.new("RGB", (width, sum(p.height for p in pages)), (255, 255, 255))
+    y = 0
+    for page in pages:
+        stitched.paste(page, (0, y))
+        y += page.height
+    return stitched
+
+
+def measure(fn, *args):
+    with EncodeCounter() as counter:
+        start = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - start
+    return counter.count, elapsed
+
+
+def main(pdf_paths):
+    workdir = tempfile.mkdtemp()
+    totals = {"compress": [0, 0], "split": [0, 0]}
+    print(f"{'file':<22}{'stage':<10}{'budget MB':>10}{'old enc':>9}{'new enc':>9}{'old s':>8}{'new s':>8}")
+    for pdf_path in pdf_paths:
+        name = os.path.basename(pdf_path)
+        stitched = render_stitched(pdf_path)
+        stitched_path = os.path.join(workdir, "stitched.png")
+        stitched.save(stitched_path)
+        for budget in BUDGETS_MB:
+            out = os.path.join(workdir, "out.jpg")
+            old_count, old_time = measure(legacy_compress_image_to_size, stitched, out, budget)
+            new_count, new_time = measure(save_jpeg_under_size, stitched, out, budget)
+            totals["compress"][0] += old_count
+            totals["compress"][1] += new_count
+            print(f"{name[:21]:<22}{'compress':<10}{budget:>10}{old_count:>9}{new_count:>9}{old_time:>8.2f}{new_time:>8.2f}")
+            old_count, old_time = measure(legacy_split_image_by_size, stitched_path, budget)
+            new_count, new_time = measure(split_image_by_size, stitched_path, budget)
+            totals["split"][0] += old_count
+            totals["split"][1] += new_count
+            print(f"{name[:21]:<22}{'split':<10}{budget:>10}{old_count:>9}{new_count:>9}{old_time:>8.2f}{new_time:>8.2f}")
+    for stage, (old, new) in totals.items():
+        saved = 100 * (old - new) / old if old else 0
+        print(f"{stage}: {old} -> {new} encodes ({saved:.0f}% fewer)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or sorted(glob.glob("test-assignments/*.pdf")))
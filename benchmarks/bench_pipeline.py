@@ -0,0 +1,227 @@
+"""Times every stage of the plagiarism pipeline, for submissions and for checks over synthetic cohorts.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_pipeline [--sizes 100 1000 10000] [--save benchmarks/baseline.json]
+                                        [--baseline benchmarks/baseline.json] [--ocr-latency 0.2]
+
+Submission stages run on test-assignments/*.pdf plus a generated typed and a generated scanned
+PDF; OCR uses a stub that sleeps --ocr-latency per request instead of calling the vision API.
+Check stages run on generated cohorts with known copying. Each stage reports wall time, peak
+RSS and JPEG encodes. --save writes the results as JSON; --baseline compares against such a
+file and exits non-zero when a stage got more than REGRESSION_RATIO slower.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pymupdf
+from PIL import Image
+from benchmarks.bench_jpeg_encode import EncodeCounter, render_stitched
+from benchmarks.synthetic import generate_cohort, make_pdf
+from utils.plag.image_split import split_image_by_size
+from utils.plag.jpeg_encode import save_jpeg_under_size
+from utils.plag.minhash import scan_cohort
+from utils.plag.ocr_pool import ocr_chunks
+from utils.plag.pdf_to_image import compress_image_to_size, pdf_to_page_chunks, pdf_to_stitched_image
+from utils.plag.phash import page_hash
+from utils.plag.preprocess import PREVIEW_DPI, choose_dpi, clean_page
+from utils.plag.embeddings import semantic_scores
+from utils.plag.store import SubmissionStore
+from utils.plag.text_layer import extract_text_layer
+
+COHORT_SIZES = [100, 1000, 10000]
+CHECK_TARGETS = 10  # single-student checks timed per cohort, reported per check
+REGRESSION_RATIO = 1.25
+MIN_REGRESSION_SECONDS = 0.1  # ignore noise on stages that take a few milliseconds
+
+
+def _reset_peak_rss():
+    # Linux: writing 5 to clear_refs resets VmHWM, so peaks can be measured per stage
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(results, key, fn, *args, per=1, **kwargs):
+    """Runs fn, records wall time (divided by per), peak RSS and JPEG encodes under key, returns fn's result."""
+    _reset_peak_rss()
+    with EncodeCounter() as counter:
+        start = time.perf_counter()
+        value = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+    results[key] = {"wall_s": elapsed / per, "peak_rss_mb": _peak_rss_mb(), "jpeg_encodes": counter.count}
+    print(f"{key:<55}{elapsed / per:>10.3f}s{results[key]['peak_rss_mb']:>9.0f} MB{counter.count:>6} enc")
+    return value
+
+
+class StubOCR:
+    """Stands in for the vision API: counts requests and sleeps a fixed latency per request."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.requests = 0
+
+    def __call__(self, image_paths):
+        self.requests += 1
+        time.sleep(self.latency)
+        return [f"Text of {os.path.basename(path)}." for path in image_paths]
+
+
+def preprocess_pages(pdf_path, output_prefix):
+    """The preprocess path of pdf_to_page_chunks, rendered with PyMuPDF so it runs without poppler."""
+    chunks = []
+    hashes = {}
+    for number, page in enumerate(pymupdf.open(pdf_path), start=1):
+        pix = page.get_pixmap(dpi=PREVIEW_DPI, colorspace=pymupdf.csGRAY)
+        preview = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+        dpi = choose_dpi(preview)
+        if dpi is None:
+            continue
+        hashes[number] = page_hash(preview)
+        pix = page.get_pixmap(dpi=dpi, colorspace=pymupdf.csGRAY)
+        cleaned = clean_page(Image.frombytes("L", (pix.width, pix.height), pix.samples), dpi)
+        if cleaned is not None:
+            chunks.append(save_jpeg_under_size(cleaned, f"{output_prefix}_page_{number}.jpg", max_quality=85))
+    return chunks, hashes
+
+
+def bench_submission(results, pdf_path, workdir, ocr_latency, poppler):
+    name = os.path.basename(pdf_path)
+    prefix = os.path.join(workdir, "chunk")
+    key = f"submission/{name}"
+    layer = measure(results, f"{key}/text_layer", extract_text_layer, pdf_path)
+    if poppler:
+        measure(results, f"{key}/pdf_to_stitched_image", pdf_to_stitched_image, pdf_path, os.path.join(workdir, "stitched.jpg"))
+        measure(results, f"{key}/pdf_to_page_chunks", lambda: list(pdf_to_page_chunks(pdf_path, prefix)))
+    stitched = measure(results, f"{key}/render_stitched", render_stitched, pdf_path)
+    measure(results, f"{key}/compress_image_to_size", compress_image_to_size, stitched, os.path.join(workdir, "out.jpg"))
+    stitched_path = os.path.join(workdir, "stitched.png")
+    stitched.save(stitched_path)
+    del stitched
+    measure(results, f"{key}/split_image_by_size", split_image_by_size, stitched_path)
+    chunks, _ = measure(results, f"{key}/preprocess_pages", preprocess_pages, pdf_path, prefix)
+    stub = StubOCR(ocr_latency)
+    texts = measure(results, f"{key}/ocr_stub", ocr_chunks, chunks, ocr=stub, policy="remote", requests_per_minute=1e9)
+    results[f"{key}/ocr_stub"]["requests"] = stub.requests
+    store = SubmissionStore(os.path.join(workdir, "submission.db"))
+    text = "".join(t + "\n" for t in layer if t) + "".join(t + "\n" for t in texts)
+    measure(results, f"{key}/index", store.add_submission, "BENCH", "Bench", pdf_path, None, text)
+    store.close()
+
+
+def bench_cohort(results, size, workdir):
+    key = f"cohort/{size}"
+    texts, copies = generate_cohort(size, seed=size)
+    store = SubmissionStore(os.path.join(workdir, f"cohort_{size}.db"))
+
+    def ingest():
+        return [store.add_submission(f"R{i:05d}", f"Student {i}", None, None, text)[0] for i, text in enumerate(texts)]
+
+    ids = measure(results, f"{key}/ingest", ingest)
+    # Copiers are the interesting targets: their checks return real matches
+    targets = [ids[copier] for copier, _, _ in copies[:CHECK_TARGETS]] or ids[:CHECK_TARGETS]
+    measure(results, f"{key}/jaccard_check", lambda: [store.sentences.similar(t) for t in targets], per=len(targets))
+    measure(results, f"{key}/fingerprint_check", lambda: [store.fingerprints.matches(t) for t in targets], per=len(targets))
+    docs = store.sentences.hash_sets(ids)
+    pairs = measure(results, f"{key}/cohort_scan", scan_cohort, docs, 0.3, top_k=len(copies) + 10)
+    found = {(ids[a], ids[b]) for a, b, _ in copies} | {(ids[b], ids[a]) for a, b, _ in copies}
+    results[f"{key}/cohort_scan"]["copies_found"] = sum((a, b) in found for a, b, _ in pairs) / max(len(copies), 1)
+    # Random unit vectors in place of MiniLM output: the matrix product costs the same
+    rng = np.random.default_rng(size)
+    vectors = {}
+    for submission_id in ids:
+        v = rng.standard_normal((30, 384)).astype(np.float32)
+        vectors[submission_id] = (v / np.linalg.norm(v, axis=1, keepdims=True)).astype(np.float16)
+    measure(results, f"{key}/semantic_check",
+            lambda: [semantic_scores(vectors[t], {i: vectors[i] for i in ids if i != t}) for t in targets],
+            per=len(targets))
+    store.close()
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    for key, metrics in results.items():
+        old = baseline.get(key)
+        if not old:
+            continue
+        ratio = metrics["wall_s"] / old["wall_s"] if old["wall_s"] else 1.0
+        if ratio > REGRESSION_RATIO and metrics["wall_s"] - old["wall_s"] > MIN_REGRESSION_SECONDS:
+            regressions.append((key, old["wall_s"], metrics["wall_s"], ratio))
+    for key, old, new, ratio in regressions:
+        print(f"REGRESSION {key}: {old:.3f}s -> {new:.3f}s ({ratio:.2f}x)")
+    if not regressions:
+        print(f"No stage more than {REGRESSION_RATIO}x slower than {baseline_path}.")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="*", default=COHORT_SIZES)
+    parser.add_argument("--pdfs", nargs="*", default=sorted(glob.glob("test-assignments/*.pdf")))
+    parser.add_argument("--ocr-latency", type=float, default=0.2, help="seconds per stubbed OCR request")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against this JSON file")
+    args = parser.parse_args()
+    poppler = shutil.which("pdftoppm") is not None
+    if not poppler:
+        print("poppler not found: skipping pdf_to_stitched_image and pdf_to_page_chunks.")
+    results = {}
+    workdir = tempfile.mkdtemp()
+    try:
+        texts, _ = generate_cohort(2, sentences_per_doc=120)
+        pdfs = list(args.pdfs) + [
+            make_pdf(os.path.join(workdir, "generated_typed.pdf"), texts[0], pages=10),
+            make_pdf(os.path.join(workdir, "generated_scanned.pdf"), texts[1], pages=10, scanned=True),
+        ]
+        for pdf_path in pdfs:
+            bench_submission(results, pdf_path, workdir, args.ocr_latency, poppler)
+        for size in args.sizes:
+            bench_cohort(results, size, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.save:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+        with open(args.save, "w") as f:
+            json.dump({
+                "meta": {
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "commit": commit,
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "cpus": os.cpu_count(),
+                    "ocr_latency": args.ocr_latency,
+                },
+                "results": results,
+            }, f, indent=2)
+        print(f"Saved {len(results)} stage results to {args.save}")
+    if args.baseline and compare(results, args.baseline):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Synthetic submissions for benchmarks: cohorts with known copying, and typed or scanned PDFs."""
+import random
+import pymupdf
+
+VOCABULARY_SIZE = 5000
+
+
+def _vocabulary(rng):
+    consonants, vowels = "bcdfghjklmnprstvwz", "aeiou"
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        words.add("".join(rng.choice(consonants) + rng.choice(vowels) for _ in range(rng.randint(1, 4))))
+    return sorted(words)
+
+
+def _sentence(rng, words):
+    sentence = " ".join(rng.choice(words) for _ in range(rng.randint(8, 16)))
+    return sentence[0].upper() + sentence[1:] + "."
+
+
+def generate_cohort(size, sentences_per_doc=30, copy_rate=0.2, copied_fraction=0.5, seed=0):
+    """size submission texts where copy_rate of them copy copied_fraction of their
+    sentences from an earlier submission.
+
+    Returns (texts, copies) with copies a list of (copier_index, source_index, fraction).
+    """
+    rng = random.Random(seed)
+    words = _vocabulary(rng)
+    docs = []
+    copies = []
+    for i in range(size):
+        sentences = [_sentence(rng, words) for _ in range(sentences_per_doc)]
+        if i and rng.random() < copy_rate:
+            source = rng.randrange(i)
+            count = int(sentences_per_doc * copied_fraction)
+            for slot, copied in zip(rng.sample(range(sentences_per_doc), count), rng.sample(docs[source], count)):
+                sentences[slot] = copied
+            copies.append((i, source, copied_fraction))
+        docs.append(sentences)
+    return [" ".join(sentences) for sentences in docs], copies
+
+
+def make_pdf(path, text, pages, scanned=False, dpi=150):
+    """Writes text over pages A4 pages. scanned=True stores each page only as an image (no
+    text layer), like a phone scan, so it takes the rasterize and OCR path."""
+    words = text.split()
+    per_page = max(len(words) // pages, 1)
+    doc = pymupdf.open()
+    for number in range(pages):
+        page = doc.new_page(width=595, height=842)
+        page.insert_textbox(pymupdf.Rect(60, 60, 535, 782), " ".join(words[number * per_page:(number + 1) * per_page]),
+                            fontsize=11)
+    if scanned:
+        images = pymupdf.open()
+        for page in doc:
+            pix = page.get_pixmap(dpi=dpi, colorspace=pymupdf.csGRAY)
+            images.new_page(width=page.rect.width, height=page.rect.height).insert_image(page.rect, pixmap=pix)
+        doc = images
+    doc.save(path)
+    return path
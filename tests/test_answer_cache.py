@@ -0,0 +1,25 @@
+from utils.buddy.answer_cache import AnswerCache, question_terms
+
+
+def test_interrogatives_and_numbers_are_question_terms():
+    assert question_terms("Why did the war start?") != question_terms("When did the war start?")
+    assert question_terms("Summarize chapter 3") != question_terms("Summarize chapter 4")
+    assert question_terms("What's a process?") == {"what", "process"}
+
+
+def test_fuzzy_match_does_not_answer_a_different_question(tmp_path):
+    cache = AnswerCache(path=str(tmp_path / "answers.db"), fuzzy=True)
+    cache.put("doc", "Why did the war start?", "model", "because")
+    cache.put("doc", "Summarize chapter 3", "model", "chapter 3 summary")
+    assert cache.get("doc", "When did the war start?", "model") is None
+    assert cache.get("doc", "Summarize chapter 4", "model") is None
+    assert cache.get("doc", "why did the war START", "model") == ("because", "why did the war start")
+
+
+def test_fuzzy_match_is_off_by_default(tmp_path):
+    cache = AnswerCache(path=str(tmp_path / "answers.db"))
+    cache.put("doc", "What causes inflation in an economy?", "model", "answer")
+    assert cache.get("doc", "In an economy, what causes inflation?", "model") is None
+    assert AnswerCache(path=str(tmp_path / "answers.db"), fuzzy=True).get(
+        "doc", "In an economy, what causes inflation?", "model"
+    ) == ("answer", "what causes inflation in an economy")
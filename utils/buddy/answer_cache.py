@@ -0,0 +1,132 @@
+"""Answer cache for AI Buddy document chat, shared by every session on the server.
+
+Answers are keyed by (document content hash, model, normalized question). A question that
+only differs in wording from a cached one (question-term Jaccard >= ANSWER_MATCH_SIMILARITY)
+is served the cached answer too when ANSWER_FUZZY_MATCH=1 (off by default). Concurrent identical
+questions are sent to the LLM once: later askers wait for the first (see SingleFlight).
+"""
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from dotenv import load_dotenv
+from utils.buddy.retrieval import STOPWORDS
+from utils.sqlite_cache import SQLiteCache, shared
+
+load_dotenv()
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "answer_cache.db")
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+ANSWER_FUZZY_MATCH = os.getenv("ANSWER_FUZZY_MATCH", "0") == "1"
+ANSWER_MATCH_SIMILARITY = 0.8
+IN_FLIGHT_TIMEOUT = 120  # seconds a duplicate question waits for the first asker's answer
+# Retrieval drops these as stopwords, but "why" and "when" ask different questions
+INTERROGATIVES = {"how", "what", "when", "where", "which", "who", "why"}
+_word = re.compile(r"\w+")
+
+
+def document_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize_question(question):
+    """Case, spacing, Unicode form and trailing punctuation do not change a question."""
+    question = unicodedata.normalize("NFKC", question).lower()
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ")
+
+
+def question_terms(question):
+    # Numbers are kept ("chapter 3" is not "chapter 4"); other one-letter tokens are mostly
+    # contractions ("what's" -> "what", "s")
+    return {
+        term for term in _word.findall(question.lower())
+        if (term not in STOPWORDS or term in INTERROGATIVES) and (len(term) > 1 or term.isdigit())
+    }
+
+
+def answer_key(doc_hash, question, model):
+    return hashlib.sha256(f"{doc_hash}\0{model}\0{normalize_question(question)}".encode("utf-8")).hexdigest()
+
+
+class AnswerCache(SQLiteCache):
+    """Answers keyed by answer_key, evicted least recently used beyond max_entries."""
+
+    table = "answers"
+    columns = """
+        doc_hash TEXT NOT NULL,
+        model TEXT NOT NULL,
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL"""
+    indexes = ("CREATE INDEX IF NOT EXISTS idx_answers_doc ON answers (doc_hash, model)",)
+    stats_table = "answer_stats"
+    counters = ("hits", "fuzzy_hits", "misses")
+
+    def __init__(self, path=ANSWER_CACHE_PATH, max_entries=ANSWER_CACHE_MAX_ENTRIES, fuzzy=ANSWER_FUZZY_MATCH):
+        super().__init__(path, max_entries=max_entries)
+        self.fuzzy = fuzzy
+
+    def get(self, doc_hash, question, model):
+        """(answer, cached question) for question about the document, or None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT key, question, answer FROM answers WHERE key = ?", (answer_key(doc_hash, question, model),)
+            ).fetchone()
+            counter = "hits"
+            if row is None and self.fuzzy:
+                row = self._closest(conn, doc_hash, question, model)
+                counter = "fuzzy_hits"
+            if row is None:
+                self._count(conn, "misses")
+                return None
+            self._touch(conn, row[0])
+            self._count(conn, counter)
+        return row[2], row[1]
+
+    def _closest(self, conn, doc_hash, question, model):
+        terms = question_terms(question)
+        if not terms:
+            return None
+        best, best_similarity = None, ANSWER_MATCH_SIMILARITY
+        for row in conn.execute(
+            "SELECT key, question, answer FROM answers WHERE doc_hash = ? AND model = ?", (doc_hash, model)
+        ):
+            other = question_terms(row[1])
+            similarity = len(terms & other) / len(terms | other) if other else 0.0
+            if similarity >= best_similarity:
+                best, best_similarity = row, similarity
+        return best
+
+    def put(self, doc_hash, question, model, answer):
+        self._store(
+            answer_key(doc_hash, question, model),
+            doc_hash=doc_hash, model=model, question=normalize_question(question), answer=answer
+        )
+
+
+class SingleFlight:
+    """Lets only the first of several concurrent callers with the same key do the work.
+
+    begin(key) returns None for that first caller, who must call end(key) when done; every
+    other caller gets an Event that is set at end(key).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = {}
+
+    def begin(self, key):
+        with self.lock:
+            if key in self.in_flight:
+                return self.in_flight[key]
+            self.in_flight[key] = threading.Event()
+            return None
+
+    def end(self, key):
+        with self.lock:
+            self.in_flight.pop(key).set()
+
+
+get_answer_cache = shared(AnswerCache)
+
+# Streamlit runs every session in a thread of one process, so this is shared by all sessions
+in_flight = SingleFlight()
@@ -0,0 +1,150 @@
+"""Map-reduce notes generation for AI Buddy.
+
+The document is split at its headings into chunks of at most NOTES_CHUNK_CHARS, notes are
+generated for the chunks concurrently (map), and the per-chunk notes are merged in document
+order (reduce). Chunk requests share one process-wide budget of NOTES_REQUESTS_PER_MINUTE
+and are retried with backoff when rate limited, like OCR requests (see ocr_pool). The merge is deterministic: notes for a whole textbook are longer than one
+completion can be, so an LLM reduce step would truncate them again.
+"""
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from dotenv import load_dotenv
+from utils.plag.ocr_pool import OCR_MAX_RETRIES, TokenBucket, call_with_retry
+
+load_dotenv()
+NOTES_CHUNK_CHARS = 12000  # about 3k tokens, the prompt size notes were generated from before chunking
+NOTES_MAX_WORKERS = int(os.getenv("NOTES_MAX_WORKERS", "4"))
+NOTES_REQUESTS_PER_MINUTE = float(os.getenv("NOTES_REQUESTS_PER_MINUTE", "30"))
+REFRESH_INTERVAL = 0.25  # seconds between partial-notes snapshots while chunks stream
+_heading_patterns = [
+    re.compile(r"#{1,6}\s+\S"),  # markdown
+    re.compile(r"(chapter|unit|module|section|part|lecture|lesson)\s+[\dIVXLC]+\b", re.IGNORECASE),
+    re.compile(r"\d+(\.\d+)*\.?\s+[A-Z][^.]{0,60}$"),  # "2.3 Process Scheduling"
+    re.compile(r"[A-Z][A-Z0-9 ,:&()'/-]{3,}$"),  # ALL CAPS
+]
+_sentence_end = re.compile(r"(?<=[.!?])\s+")
+# Streamlit runs every session in a thread of one process, so all sessions share the API budget
+notes_bucket = TokenBucket(NOTES_REQUESTS_PER_MINUTE / 60, capacity=NOTES_MAX_WORKERS)
+
+
+def is_heading(line):
+    line = line.strip()
+    if not line or len(line) > 100 or line.endswith((".", ",", ";")):
+        return False
+    return any(pattern.match(line) for pattern in _heading_patterns)
+
+
+def split_sections(text):
+    """[(heading, body)] in document order; text before the first heading has heading None."""
+    sections = [[None, []]]
+    for line in text.splitlines():
+        if is_heading(line):
+            sections.append([line.strip().lstrip("#").strip(), []])
+        else:
+            sections[-1][1].append(line)
+    return [(heading, "\n".join(lines).strip()) for heading, lines in sections if heading or "".join(lines).strip()]
+
+
+def _split_long(text, max_chars):
+    """Pieces of text under max_chars, cut at paragraph, then line, then sentence boundaries."""
+    if len(text) <= max_chars:
+        return [text]
+    for separator in (re.compile(r"\n\s*\n"), re.compile(r"\n"), _sentence_end):
+        parts = [part for part in separator.split(text) if part.strip()]
+        if len(parts) > 1:
+            break
+    else:
+        return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+    pieces = []
+    current = ""
+    for part in parts:
+        for piece in _split_long(part, max_chars):
+            if current and len(current) + len(piece) + 1 > max_chars:
+                pieces.append(current)
+                current = ""
+            current = f"{current}\n{piece}" if current else piece
+    return pieces + [current] if current else pieces
+
+
+def chunk_document(text, max_chars=NOTES_CHUNK_CHARS):
+    """Consecutive sections packed into chunks of at most max_chars: [{"title", "text"}].
+
+    A chunk starts at a heading where possible; a section too long for one chunk is split
+    at paragraph boundaries and its later parts are titled "<heading> (continued)". A heading
+    always stays in the chunk of the first part of its section.
+    """
+    chunks = []
+    for heading, body in split_sections(text):
+        if heading:
+            pieces = _split_long(body, max(max_chars - len(heading) - 1, 1)) if body else [""]
+            pieces[0] = f"{heading}\n{pieces[0]}".rstrip()
+        else:
+            pieces = _split_long(body, max_chars)
+        for number, piece in enumerate(pieces):
+            title = heading if number == 0 else f"{heading} (continued)" if heading else None
+            if chunks and number == 0 and len(chunks[-1]["text"]) + len(piece) + 2 <= max_chars:
+                chunks[-1]["text"] += "\n\n" + piece
+            else:
+                chunks.append({"title": title, "text": piece})
+    for number, chunk in enumerate(chunks, start=1):
+        chunk["title"] = chunk["title"] or f"Part {number}"
+    return chunks
+
+
+def chunk_prompt(instructions, chunk, index, total):
+    if total == 1:
+        return f"{instructions}\n\nDocument Content:\n{chunk['text']}"
+    return (
+        f"{instructions}\n\nThis is part {index + 1} of {total} of the document, starting at \"{chunk['title']}\". "
+        "Write the notes for this part only, without an introduction or conclusion for the whole document."
+        f"\n\nDocument Content:\n{chunk['text']}"
+    )
+
+
+def map_chunks(chunks, generate, max_workers=NOTES_MAX_WORKERS, refresh_interval=REFRESH_INTERVAL,
+               bucket=notes_bucket, max_retries=OCR_MAX_RETRIES):
+    """Runs generate(index, chunk, on_text) for every chunk, at most max_workers at a time.
+    generate returns the chunk's notes and may call on_text(text_so_far) while they stream in.
+    Each call takes a token from bucket and is retried on rate limits and server errors; a
+    retried chunk streams again from the start.
+
+    Yields snapshots (partial, errors, done): {index: notes so far}, {index: exception} and
+    the number of finished chunks, whenever a chunk finishes and every refresh_interval
+    seconds in between. Snapshots are taken in the caller's thread, so it can update the UI.
+    """
+    notes = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(
+                call_with_retry,
+                partial(generate, index, chunk, lambda text, index=index: notes.__setitem__(index, text)),
+                bucket, max_retries
+            ): index
+            for index, chunk in enumerate(chunks)
+        }
+        pending = set(futures)
+        while pending:
+            finished, pending = wait(pending, timeout=refresh_interval, return_when=FIRST_COMPLETED)
+            for future in finished:
+                try:
+                    notes[futures[future]] = future.result()
+                except Exception as e:
+                    errors[futures[future]] = e
+            yield dict(notes), dict(errors), len(futures) - len(pending)
+
+
+def merge_notes(chunks, notes):
+    """One notes document from {index: notes} in chunk order; chunks without notes yet are marked pending."""
+    if len(chunks) == 1:
+        return notes.get(0) or "_Generating..._"
+    parts = []
+    for index, chunk in enumerate(chunks):
+        body = notes.get(index)
+        # The part's own headings move below the part's heading
+        body = re.sub(r"^(#{1,6}) ", lambda m: "#" * min(len(m.group(1)) + 2, 6) + " ", body, flags=re.MULTILINE) \
+            if body else "_Generating..._"
+        parts.append(f"## {chunk['title']}\n\n{body}")
+    return "\n\n".join(parts)
@@ -0,0 +1,117 @@
+"""Passage retrieval for AI Buddy document Q&A.
+
+A document is split into overlapping passages once, when it is processed; each question
+then sends only the top-k passages to the LLM instead of a fixed prefix of the document.
+Passages are ranked by BM25 and, when the MiniLM model is installed (see
+utils.plag.embeddings), also by embedding similarity, with the two rankings fused.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+import numpy as np
+from utils.plag.embeddings import get_engine, semantic_available
+
+PASSAGE_CHARS = 800  # about 170 tokens, so MiniLM (128-token window) sees most of each passage
+OVERLAP_CHARS = 160  # an answer spanning a passage boundary is still whole in one passage
+TOP_K = 6
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60  # reciprocal rank fusion constant
+STOPWORDS = set("""
+a an and are as at be but by do does for from has have how i if in is it its of on or so than that the their them
+then there these they this to was were what when where which who why will with you your
+""".split())
+_sentence_end = re.compile(r"(?<=[.!?])\s+|\n+")
+_word = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return [word for word in _word.findall(text.lower()) if word not in STOPWORDS]
+
+
+def split_passages(pages, passage_chars=PASSAGE_CHARS, overlap_chars=OVERLAP_CHARS):
+    """Overlapping passages of whole sentences from a list of page texts.
+
+    Returns [{"text", "page"}] where page is the 1-based page the passage starts on.
+    """
+    sentences = [
+        (number, sentence.strip())
+        for number, page in enumerate(pages, start=1) if page
+        for sentence in _sentence_end.split(page) if sentence.strip()
+    ]
+    passages = []
+    start = 0
+    while start < len(sentences):
+        end = start
+        length = 0
+        while end < len(sentences) and (end == start or length + len(sentences[end][1]) <= passage_chars):
+            length += len(sentences[end][1]) + 1
+            end += 1
+        passages.append({"text": " ".join(sentence for _, sentence in sentences[start:end]), "page": sentences[start][0]})
+        if end == len(sentences):
+            break
+        # The next passage repeats the last sentences of this one, up to overlap_chars
+        next_start = end
+        carried = 0
+        while next_start - 1 > start and carried + len(sentences[next_start - 1][1]) <= overlap_chars:
+            next_start -= 1
+            carried += len(sentences[next_start][1]) + 1
+        start = next_start
+    return passages
+
+
+class BM25:
+    def __init__(self, documents, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.lengths = np.array([len(tokens) for tokens in documents], dtype=np.float32)
+        self.average_length = float(self.lengths.mean()) if len(documents) else 0.0
+        # term -> (passage indices, term frequencies), so a query only touches passages containing its terms
+        postings = defaultdict(lambda: ([], []))
+        for index, tokens in enumerate(documents):
+            for term, count in Counter(tokens).items():
+                postings[term][0].append(index)
+                postings[term][1].append(count)
+        self.postings = {term: (np.array(ids), np.array(counts, dtype=np.float32)) for term, (ids, counts) in postings.items()}
+        n = len(documents)
+        self.idf = {term: math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5)) for term, (ids, _) in self.postings.items()}
+
+    def scores(self, query_tokens):
+        scores = np.zeros(len(self.lengths), dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.lengths / max(self.average_length, 1e-9))
+        for term in set(query_tokens):
+            if term not in self.postings:
+                continue
+            ids, counts = self.postings[term]
+            scores[ids] += self.idf[term] * counts * (self.k1 + 1) / (counts + norm[ids])
+        return scores
+
+
+class PassageIndex:
+    """Passages of one document with their BM25 index and, if available, embeddings."""
+
+    def __init__(self, pages):
+        self.passages = split_passages(pages)
+        self.bm25 = BM25([tokenize(passage["text"]) for passage in self.passages])
+        self.vectors = None
+        if self.passages and semantic_available():
+            self.vectors = get_engine().embed([passage["text"] for passage in self.passages])
+
+    def search(self, question, k=TOP_K):
+        """The k passages most relevant to question, in document order."""
+        if len(self.passages) <= k:
+            return list(self.passages)
+        bm25 = self.bm25.scores(tokenize(question))
+        # Passages sharing no term with the question get no BM25 rank at all
+        rankings = [np.argsort(-bm25, kind="stable")[:np.count_nonzero(bm25)]]
+        if self.vectors is not None:
+            rankings.append(np.argsort(-(self.vectors @ get_engine().embed([question])[0]), kind="stable"))
+        # Reciprocal rank fusion: no score calibration needed between BM25 and cosine
+        fused = np.zeros(len(self.passages))
+        for ranking in rankings:
+            fused[ranking] += 1 / (RRF_K + np.arange(1, len(ranking) + 1))
+        top = [i for i in np.argsort(-fused, kind="stable")[:k] if fused[i] > 0]
+        if not top:
+            # Nothing matched: the start of the document at least lets the model say so in context
+            top = range(k)
+        return [self.passages[i] for i in sorted(top)]
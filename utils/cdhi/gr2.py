@@ -5,6 +5,9 @@ from dotenv import load_dotenv
 from agno.agent import Agent
 from agno.models.groq import Groq
 from agno.tools.duckduckgo import DuckDuckGoTools
+from utils.streaming import agent_deltas, timed_stream
+
+REPORT_MODEL = "llama-3.3-70b-versatile"
 
 
 def generated_report():
@@ -16,7 +19,7 @@ def generated_report():
 
     # — Load Agno LLM pipeline (Groq model)
     agent = Agent(
-        model=Groq(id="llama-3.3-70b-versatile", api_key=groq_api_key),
+        model=Groq(id=REPORT_MODEL, api_key=groq_api_key),
         tools=[DuckDuckGoTools()],
         markdown=True,
         show_tool_calls=True,
@@ -48,25 +51,28 @@ def generated_report():
         st.markdown(resume_text)
 
 
-    # — Generate report
+    # — Generate report, shown as it streams in
+    streamed = False
     if st.button(":material/school: Generate Career Report"):
-        with st.spinner("Running Agno Agent..."):
-            prompt = build_prompt(github_df, semester_data, resume_text, top_lang)
-            report = agent.run(prompt)
-            if hasattr(report, "content"):
-                report = report.content
-            st.session_state["career_report"] = report
+        st.subheader(":material/assignment_late: Career Report")
+        prompt = build_prompt(github_df, semester_data, resume_text, top_lang)
+        stats = {}
+        report = st.write_stream(timed_stream(agent_deltas(agent.run(prompt, stream=True)), "career_report", stats, REPORT_MODEL))
+        st.caption(f"First token after {stats.get('ttft_s', 0):.1f}s, full report in {stats['total_s']:.1f}s")
+        st.session_state["career_report"] = report
+        streamed = True
 
     # — Display saved report
     if "career_report" in st.session_state:
-        st.subheader(":material/assignment_late: Career Report")
-        st.markdown(st.session_state["career_report"])
+        if not streamed:
+            st.subheader(":material/assignment_late: Career Report")
+            st.markdown(st.session_state["career_report"])
 
         # — Enrich via Agno search
         st.subheader(":material/lightbulb: Course Suggestions")
 
         agent = Agent(
-            model=Groq(id="llama-3.3-70b-versatile", api_key=groq_api_key),
+            model=Groq(id=REPORT_MODEL, api_key=groq_api_key),
             tools=[DuckDuckGoTools()],
             markdown=True,
             show_tool_calls=True,
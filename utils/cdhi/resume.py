@@ -1,8 +1,6 @@
 import streamlit as st
 import PyPDF2
-import os
-import tempfile
-import pymupdf4llm
+from utils.extraction_cache import get_extraction_cache
 
 # Function to extract text from PDF
 def extract_text_from_pdf(pdf_file):
@@ -24,19 +22,8 @@ def resume():
     uploaded_file = st.file_uploader("Choose your resume PDF", type="pdf")
 
     if uploaded_file:
-        temp_dir = tempfile.mkdtemp()
-        path = os.path.join(temp_dir, uploaded_file.name)
-        with open(path, "wb") as f:
-                f.write(uploaded_file.getvalue())
-
-
-        #import pymupdf
-        #doc = pymupdf.open(path)
-        #for page in doc:
-            #resume_text = page.get_text()
-
-
-        resume_text = pymupdf4llm.to_markdown(path)
+        # Parsed once per file content; reruns and other users uploading the same resume hit the cache
+        resume_text = get_extraction_cache().extract(uploaded_file.getvalue(), "pdf_markdown")
         if resume_text:
             st.success(":material/check: Resume uploaded and processed successfully!")
             with st.expander("Extracted Resume Text"):
@@ -0,0 +1,94 @@
+"""Document text extraction shared by AI Buddy and the resume extractor, cached on disk.
+
+Results are keyed by the SHA-256 of the file bytes plus the extractor's name, code version
+and parsing library version, so a document is parsed once for every user and rerun, and a
+library upgrade or extractor change re-parses instead of serving stale text. Files are
+parsed from memory; no temp files are written.
+"""
+import hashlib
+import io
+import json
+import os
+from importlib.metadata import PackageNotFoundError, version
+from dotenv import load_dotenv
+from utils.sqlite_cache import SQLiteCache, shared
+
+load_dotenv()
+EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", "extraction_cache.db")
+EXTRACTION_CACHE_MAX_MB = float(os.getenv("EXTRACTION_CACHE_MAX_MB", "256"))
+
+
+def _pdf_pages(data):
+    import pymupdf
+    with pymupdf.open(stream=data, filetype="pdf") as doc:
+        return [page.get_text() for page in doc]
+
+
+def _docx_paragraphs(data):
+    import docx
+    return [p.text for p in docx.Document(io.BytesIO(data)).paragraphs if p.text.strip()]
+
+
+def _pptx_texts(data):
+    from pptx import Presentation
+    return [shape.text.strip() for slide in Presentation(io.BytesIO(data)).slides
+            for shape in slide.shapes
+            if hasattr(shape, 'text') and shape.text.strip()]
+
+
+def _pdf_markdown(data):
+    import pymupdf
+    import pymupdf4llm
+    with pymupdf.open(stream=data, filetype="pdf") as doc:
+        return pymupdf4llm.to_markdown(doc)
+
+
+# name: (function, code version, distribution whose version also goes into the key).
+# Bump the code version whenever an extractor's output changes.
+EXTRACTORS = {
+    "pdf_pages": (_pdf_pages, 2, "PyMuPDF"),
+    "docx_paragraphs": (_docx_paragraphs, 1, "python-docx"),
+    "pptx_texts": (_pptx_texts, 1, "python-pptx"),
+    "pdf_markdown": (_pdf_markdown, 1, "pymupdf4llm"),
+}
+
+
+def extractor_version(name):
+    _, code_version, distribution = EXTRACTORS[name]
+    try:
+        return f"{code_version}/{distribution}-{version(distribution)}"
+    except PackageNotFoundError:
+        return str(code_version)
+
+
+def document_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def extraction_key(data, name):
+    return f"{document_key(data)}:{name}:{extractor_version(name)}"
+
+
+class ExtractionCache(SQLiteCache):
+    """Disk-backed extraction results (as JSON), evicted least recently used beyond max_bytes."""
+
+    table = "extractions"
+    columns = "result TEXT NOT NULL"
+    stats_table = "extraction_stats"
+
+    def __init__(self, path=EXTRACTION_CACHE_PATH, max_bytes=EXTRACTION_CACHE_MAX_MB * 1024 * 1024):
+        super().__init__(path, max_bytes=max_bytes)
+
+    def extract(self, data, name):
+        """The output of extractor name (see EXTRACTORS) on the file bytes data, parsed at most once."""
+        key = extraction_key(data, name)
+        row = self._lookup(key, "result")
+        if row:
+            return json.loads(row[0])
+        result = EXTRACTORS[name][0](data)
+        encoded = json.dumps(result)
+        self._store(key, size=len(encoded.encode("utf-8")), result=encoded)
+        return result
+
+
+get_extraction_cache = shared(ExtractionCache)
@@ -0,0 +1,206 @@
+"""Content-addressed storage for uploaded PDFs, and cleanup of intermediate images.
+
+Uploads are stored once per distinct content under ARTIFACT_DIR/<2 hex>/<sha256><suffix>,
+so a resubmission of the same file (under any name or roll number) costs no extra disk.
+Reference counts are kept by triggers on the submissions and jobs tables: a blob is
+referenced while a submission points at it or a queued/running job will read it.
+
+Usage: python -m utils.plag.artifacts gc [--dry-run] [--db submissions.db]
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "artifacts")
+# "delete" removes OCR page chunks once their text is extracted; "keep" leaves them for debugging
+CHUNK_RETENTION = os.getenv("CHUNK_RETENTION", "delete")
+GC_GRACE_SECONDS = 3600  # files younger than this may belong to a submission still being processed
+UPLOAD_DIR = "uploads"
+STITCHED_DIR = "stitched"
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def discard_chunks(paths):
+    """Deletes OCR page chunks after OCR, unless CHUNK_RETENTION=keep. Returns the bytes freed."""
+    if CHUNK_RETENTION == "keep":
+        return 0
+    freed = 0
+    for path in paths:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            freed += size
+        except FileNotFoundError:
+            pass
+    return freed
+
+
+class ArtifactStore:
+    """Blob store whose index lives in the submissions database (see module docstring)."""
+
+    def __init__(self, conn, root=ARTIFACT_DIR):
+        self.conn = conn
+        self.root = root
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS artifacts (
+                hash TEXT PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE,
+                size INTEGER NOT NULL,
+                refcount INTEGER NOT NULL DEFAULT 0,
+                last_put REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_artifacts_refcount ON artifacts (refcount);
+        """)
+        tables = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "submissions" in tables:
+            self.conn.executescript("""
+                CREATE TRIGGER IF NOT EXISTS artifacts_submission_insert AFTER INSERT ON submissions BEGIN
+                    UPDATE artifacts SET refcount = refcount + 1 WHERE path IN (NEW.pdf_path, NEW.stitched_path);
+                END;
+                CREATE TRIGGER IF NOT EXISTS artifacts_submission_delete AFTER DELETE ON submissions BEGIN
+                    UPDATE artifacts SET refcount = refcount - 1 WHERE path IN (OLD.pdf_path, OLD.stitched_path);
+                END;
+            """)
+        if "jobs" in tables:
+            # A job holds its PDF until it is done or failed; a done job's submission holds it from then on
+            self.conn.executescript("""
+                CREATE TRIGGER IF NOT EXISTS artifacts_job_insert AFTER INSERT ON jobs BEGIN
+                    UPDATE artifacts SET refcount = refcount + 1 WHERE path = NEW.pdf_path;
+                END;
+                CREATE TRIGGER IF NOT EXISTS artifacts_job_finish AFTER UPDATE OF status ON jobs
+                WHEN NEW.status IN ('done', 'failed') AND OLD.status NOT IN ('done', 'failed') BEGIN
+                    UPDATE artifacts SET refcount = refcount - 1 WHERE path = NEW.pdf_path;
+                END;
+            """)
+
+    def put(self, data, suffix=""):
+        """Stores data unless identical content is already stored. Returns the blob's path,
+        which callers record (as pdf_path) in the row that references it."""
+        digest = content_hash(data)
+        row = self.conn.execute("SELECT path FROM artifacts WHERE hash = ?", (digest,)).fetchone()
+        path = row[0] if row else os.path.join(self.root, digest[:2], digest + suffix)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename, so a half-written blob is never visible under its final name
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        # last_put gives a fresh blob the grace period before its referencing row is inserted
+        self.conn.execute(
+            "INSERT INTO artifacts (hash, path, size, last_put) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (hash) DO UPDATE SET last_put = excluded.last_put",
+            (digest, path, len(data), time.time())
+        )
+        return path
+
+    def stats(self):
+        blobs, stored, logical = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(size * MAX(refcount, 1)), 0) FROM artifacts"
+        ).fetchone()
+        return {"blobs": blobs, "bytes": stored, "deduplicated_bytes": logical - stored}
+
+    def gc(self, dry_run=False, grace_seconds=GC_GRACE_SECONDS):
+        """Deletes unreferenced blobs, stale intermediate images in stitched/ and uploads/
+        files no submission or pending job refers to. Returns {category: (files, bytes)}."""
+        cutoff = time.time() - grace_seconds
+        report = {}
+        rows = self.conn.execute(
+            "SELECT hash, path, size FROM artifacts WHERE refcount <= 0 AND last_put < ?", (cutoff,)
+        ).fetchall()
+        files = freed = 0
+        for digest, path, size in rows:
+            if not dry_run:
+                # Recheck under the write lock: the blob may have been put or referenced since
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    deleted = self.conn.execute(
+                        "DELETE FROM artifacts WHERE hash = ? AND refcount <= 0 AND last_put < ?", (digest, cutoff)
+                    ).rowcount
+                    if deleted:
+                        _remove(path)
+                finally:
+                    self.conn.execute("COMMIT")
+                if not deleted:
+                    continue
+            files += 1
+            freed += size
+        report["unreferenced blobs"] = (files, freed)
+        known = {row[0] for row in self.conn.execute("SELECT path FROM artifacts")}
+        report["orphaned blob files"] = _sweep(self.root, lambda path: path not in known, cutoff, dry_run)
+        referenced = {os.path.normpath(row[0]) for row in self.conn.execute(
+            "SELECT pdf_path FROM submissions WHERE pdf_path IS NOT NULL "
+            "UNION SELECT stitched_path FROM submissions WHERE stitched_path IS NOT NULL"
+        )}
+        tables = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "jobs" in tables:
+            referenced |= {os.path.normpath(row[0]) for row in self.conn.execute(
+                "SELECT pdf_path FROM jobs WHERE status NOT IN ('done', 'failed')"
+            )}
+        # Page chunks and stitched images are only needed while their submission is OCR'd
+        report["stale intermediate images"] = _sweep(
+            STITCHED_DIR, lambda path: os.path.normpath(path) not in referenced, cutoff, dry_run
+        )
+        report["orphaned uploads"] = _sweep(
+            UPLOAD_DIR, lambda path: os.path.normpath(path) not in referenced, cutoff, dry_run
+        )
+        return report
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _sweep(directory, is_garbage, cutoff, dry_run):
+    """Deletes files under directory older than cutoff for which is_garbage(path). Returns (files, bytes)."""
+    files = freed = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime >= cutoff or not is_garbage(path):
+                continue
+            if not dry_run:
+                _remove(path)
+            files += 1
+            freed += stat.st_size
+    return files, freed
+
+
+def _format_bytes(size):
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+if __name__ == "__main__":
+    from utils.plag.jobs import JobQueue
+    from utils.plag.store import DB_PATH, SubmissionStore
+    parser = argparse.ArgumentParser(description="Artifact store maintenance.")
+    parser.add_argument("command", choices=["gc"])
+    parser.add_argument("--dry-run", action="store_true", help="report what would be deleted without deleting")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+    # Opening the queue creates the jobs table and its triggers, so pending jobs' uploads are protected
+    JobQueue(args.db).close()
+    store = SubmissionStore(args.db)
+    report = store.artifacts.gc(dry_run=args.dry_run)
+    verb = "Would reclaim" if args.dry_run else "Reclaimed"
+    for category, (files, freed) in report.items():
+        print(f"{category:<28}{files:>8} files{_format_bytes(freed):>12}")
+    print(f"{verb} {_format_bytes(sum(freed for _, freed in report.values()))}.")
+    stats = store.artifacts.stats()
+    print(f"Artifact store: {stats['blobs']} blobs, {_format_bytes(stats['bytes'])} on disk, "
+          f"{_format_bytes(stats['deduplicated_bytes'])} saved by deduplication")
+    store.close()
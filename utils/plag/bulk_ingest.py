@@ -0,0 +1,190 @@
+"""Bulk ingestion of a folder or zip of submission PDFs.
+
+Usage: python -m utils.plag.bulk_ingest <folder|zip> [--mapping roll_map.csv] [--workers N] [--ocr-concurrency M]
+
+The mapping CSV has the columns filename, roll_no, name; without one, each file's name (minus
+.pdf) is used as both roll number and name. Pages are rasterized in a process pool across all
+cores while OCR runs with bounded concurrency; rasterization pauses while more than
+OCR_BACKLOG rendered PDFs per OCR slot wait for OCR, so a slow or rate-limited OCR stage does
+not fill the disk with page chunks. Each PDF is stored as soon as its OCR finishes,
+so an interrupted run can simply be started again: PDFs already in the database are skipped.
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from utils.plag.artifacts import STITCHED_DIR, content_hash, discard_chunks
+from utils.plag.ocr_pool import OCR_MAX_WORKERS, OCR_REQUESTS_PER_MINUTE, TokenBucket, ocr_chunks
+from utils.plag.pdf_to_image import pdf_to_page_chunks
+from utils.plag.pipeline import merge_page_texts, store_submission
+from utils.plag.store import DB_PATH, SubmissionStore
+from utils.plag.text_layer import extract_text_layer
+from utils.plag.ocr_cache import get_ocr_cache
+
+OCR_BACKLOG = 2  # rendered PDFs queued per OCR slot before rasterization waits
+
+
+def read_sources(source):
+    """Yields (filename, pdf bytes) for every PDF in a folder (recursively) or zip."""
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                name = os.path.basename(info.filename)
+                if not info.is_dir() and name.lower().endswith(".pdf") and not info.filename.startswith("__MACOSX/"):
+                    yield name, archive.read(info)
+        return
+    for root, _, files in os.walk(source):
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                with open(os.path.join(root, name), "rb") as f:
+                    yield name, f.read()
+
+
+def read_mapping(path):
+    """{filename: (roll_no, name)} from a CSV with filename, roll_no and name columns."""
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row["filename"].strip(): (row["roll_no"].strip(), row["name"].strip()) for row in csv.DictReader(f)}
+
+
+def rasterize_submission(pdf_path, chunk_prefix):
+    """Text layer plus OCR-ready page chunks of one PDF; runs in a worker process.
+
+    Returns (layer, [(page_number, chunk_path)], {page_number: page_hash}, seconds).
+    """
+    start = time.perf_counter()
+    layer = extract_text_layer(pdf_path)
+    ocr_pages = [number for number, text in enumerate(layer, start=1) if text is None]
+    page_hashes = {}
+
+    def record_hash(number, page_hash):
+        if page_hash is not None:
+            page_hashes[number] = page_hash
+        return False
+
+    chunks = list(pdf_to_page_chunks(pdf_path, chunk_prefix, pages=ocr_pages, skip_page=record_hash)) if ocr_pages else []
+    return layer, chunks, page_hashes, time.perf_counter() - start
+
+
+def ingest(source, mapping=None, workers=None, ocr_concurrency=None, db_path=DB_PATH):
+    os.makedirs(STITCHED_DIR, exist_ok=True)
+    store = SubmissionStore(db_path)
+    stats = {"stored": 0, "skipped": 0, "unmapped": 0, "failed": 0, "pages": 0, "ocr_pages": 0, "raster_seconds": 0.0}
+    cache_before = get_ocr_cache().stats()
+    ocr_concurrency = ocr_concurrency or OCR_MAX_WORKERS
+    # One rate limit for the whole run, however many PDFs are being OCR'd at once
+    bucket = TokenBucket(OCR_REQUESTS_PER_MINUTE / 60, capacity=ocr_concurrency)
+    start = time.perf_counter()
+    workers = workers or os.cpu_count()
+    raster_pool = ProcessPoolExecutor(max_workers=workers)
+    ocr_pool = ThreadPoolExecutor(max_workers=ocr_concurrency)
+    pending = {}
+    # PDFs being rendered or waiting for OCR; their page chunks are on disk until OCR finishes
+    max_pending = workers + ocr_concurrency * (1 + OCR_BACKLOG)
+
+    def finish(job, layer, page_texts, page_hashes):
+        text = merge_page_texts(layer, page_texts)
+        submission_id, version = store_submission(store, job["roll_no"], job["name"], job["pdf_path"], text, page_hashes)
+        stats["stored"] += 1
+        stats["pages"] += len(layer)
+        stats["ocr_pages"] += len(page_texts)
+        print(f"[{stats['stored']}] {job['filename']} -> {job['roll_no']} v{version} "
+              f"({len(layer)} pages, {len(page_texts)} OCR'd)")
+
+    def handle(future):
+        kind, job = pending.pop(future)
+        # A failure anywhere, storing included (a locked database, a bad roll number), fails this PDF only
+        try:
+            advance(kind, job, future.result())
+        except Exception as e:
+            discard_chunks(path for _, path in job.get("chunks", []))
+            stats["failed"] += 1
+            print(f"FAILED {job['filename']}: {type(e).__name__}: {e}", file=sys.stderr)
+
+    def advance(kind, job, result):
+        if kind == "raster":
+            layer, chunks, page_hashes, seconds = result
+            stats["raster_seconds"] += seconds
+            job.update(layer=layer, chunks=chunks, page_hashes=page_hashes)
+            if not chunks:
+                finish(job, layer, {}, page_hashes)
+                return
+            # Each PDF gets one OCR request in flight, so ocr_concurrency bounds the total
+            ocr_future = ocr_pool.submit(ocr_chunks, [path for _, path in chunks], max_workers=1, bucket=bucket)
+            pending[ocr_future] = ("ocr", job)
+        else:
+            discard_chunks(path for _, path in job["chunks"])
+            page_texts = {number: text for (number, _), text in zip(job["chunks"], result)}
+            finish(job, job["layer"], page_texts, job["page_hashes"])
+
+    try:
+        for filename, data in read_sources(source):
+            if mapping is not None and filename not in mapping:
+                stats["unmapped"] += 1
+                print(f"No roll number for {filename}; skipped.", file=sys.stderr)
+                continue
+            roll_no, name = mapping[filename] if mapping is not None else (filename[:-4],) * 2
+            # The artifact path is the content hash, so reruns recognise PDFs already stored for this roll number
+            pdf_path = store.artifacts.put(data, suffix=".pdf")
+            if store.conn.execute(
+                "SELECT 1 FROM submissions WHERE roll_no = ? AND pdf_path = ?", (roll_no, pdf_path)
+            ).fetchone():
+                stats["skipped"] += 1
+                continue
+            while len(pending) >= max_pending:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    handle(future)
+            key = f"{roll_no}_{content_hash(data)[:12]}"
+            job = {"filename": filename, "roll_no": roll_no, "name": name, "pdf_path": pdf_path}
+            future = raster_pool.submit(rasterize_submission, pdf_path, os.path.join(STITCHED_DIR, key))
+            pending[future] = ("raster", job)
+            # Store whatever has finished while the rest of the source is still being read
+            for future in [future for future in pending if future.done()]:
+                handle(future)
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                handle(future)
+    except KeyboardInterrupt:
+        print("Interrupted; rerun the same command to resume.", file=sys.stderr)
+    finally:
+        raster_pool.shutdown(cancel_futures=True)
+        ocr_pool.shutdown(cancel_futures=True)
+        store.close()
+    elapsed = time.perf_counter() - start
+    cache_after = get_ocr_cache().stats()
+    stats["elapsed"] = elapsed
+    stats["cache_hits"] = cache_after["hits"] - cache_before["hits"]
+    stats["cache_misses"] = cache_after["misses"] - cache_before["misses"]
+    return stats
+
+
+def print_stats(stats):
+    elapsed = stats["elapsed"]
+    print(f"\nStored {stats['stored']} submissions, skipped {stats['skipped']} already ingested, "
+          f"{stats['unmapped']} unmapped, {stats['failed']} failed in {elapsed:.1f}s")
+    if elapsed > 0:
+        print(f"Throughput: {stats['stored'] / elapsed * 60:.1f} PDFs/min, {stats['pages'] / elapsed:.2f} pages/s "
+              f"({stats['ocr_pages']} of {stats['pages']} pages OCR'd)")
+    print(f"Rasterization: {stats['raster_seconds']:.1f} CPU-seconds across workers; "
+          f"OCR cache: {stats['cache_hits']} hits, {stats['cache_misses']} misses")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest a folder or zip of submission PDFs.")
+    parser.add_argument("source", help="folder or .zip of PDFs")
+    parser.add_argument("--mapping", help="CSV with filename, roll_no, name columns")
+    parser.add_argument("--workers", type=int, help="rasterization processes (default: all cores)")
+    parser.add_argument("--ocr-concurrency", type=int, help=f"PDFs OCR'd at once (default: {OCR_MAX_WORKERS})")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+    print_stats(ingest(
+        args.source,
+        mapping=read_mapping(args.mapping) if args.mapping else None,
+        workers=args.workers,
+        ocr_concurrency=args.ocr_concurrency,
+        db_path=args.db
+    ))
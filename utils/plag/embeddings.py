@@ -0,0 +1,181 @@
+import os
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from utils.plag.sentence_index import QUERY_BATCH_SIZE, normalize_sentence, split_into_sentences
+
+load_dotenv()
+MODEL_DIR = os.path.join("openvino_models", "miniLM_openvino")  # written by convert_miniLM_openvino.py
+MODEL_FILES = {"fp32": "openvino_model.xml", "int8": "openvino_model_int8.xml"}
+# int8 is used when the export produced it, fp32 otherwise
+EMBEDDING_PRECISION = os.getenv("EMBEDDING_PRECISION", "int8")
+# Compiled models are cached here, so only the first start after an export pays for compilation
+OV_CACHE_DIR = os.getenv("OV_CACHE_DIR", os.path.join("openvino_models", "cache"))
+MAX_TOKENS = 128
+BATCH_SIZE = 32
+MIN_SENTENCE_CHARS = 20  # shorter fragments ("See below.") match everything
+PARAPHRASE_SIMILARITY = 0.8  # cosine at which two MiniLM sentence embeddings say the same thing
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def model_path(model_dir=MODEL_DIR, precision=None):
+    """IR file for precision, falling back to fp32 when the requested variant was not exported."""
+    path = os.path.join(model_dir, MODEL_FILES[precision or EMBEDDING_PRECISION])
+    return path if os.path.exists(path) else os.path.join(model_dir, MODEL_FILES["fp32"])
+
+
+def embedding_model(model_dir=MODEL_DIR, precision=None):
+    """The model variant ("fp32" or "int8") that embeddings come from, stored with every submission's vectors."""
+    name = os.path.basename(model_path(model_dir, precision))
+    return next(variant for variant, file in MODEL_FILES.items() if file == name)
+
+
+def semantic_available(model_dir=MODEL_DIR):
+    return os.path.exists(model_path(model_dir))
+
+
+def load_tokenizer(model_dir=MODEL_DIR):
+    from tokenizers import Tokenizer
+    tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+    tokenizer.enable_truncation(max_length=MAX_TOKENS)
+    tokenizer.enable_padding()
+    return tokenizer
+
+
+def encode(tokenizer, sentences, input_names):
+    """Model inputs for a batch of sentences, restricted to the inputs the model declares."""
+    encodings = tokenizer.encode_batch(sentences)
+    inputs = {
+        "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+        "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+        "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+    }
+    return {name: value for name, value in inputs.items() if name in input_names}, inputs["attention_mask"]
+
+
+def submission_sentences(text):
+    """The distinct sentences of a submission that are long enough to compare by meaning."""
+    seen = set()
+    sentences = []
+    for sentence in split_into_sentences(text or ""):
+        key = normalize_sentence(sentence)
+        if len(key) >= MIN_SENTENCE_CHARS and key not in seen:
+            seen.add(key)
+            sentences.append(sentence)
+    return sentences
+
+
+class EmbeddingEngine:
+    """all-MiniLM-L6-v2 on OpenVINO: batched, mean-pooled, L2-normalised sentence embeddings."""
+
+    def __init__(self, model_dir=MODEL_DIR, device="CPU", precision=None, cache_dir=OV_CACHE_DIR):
+        import openvino as ov
+        self.tokenizer = load_tokenizer(model_dir)
+        self.path = model_path(model_dir, precision)
+        core = ov.Core()
+        if cache_dir:
+            core.set_property({"CACHE_DIR": cache_dir})
+        # Compiling from the path (not a read model) lets OpenVINO load a cached blob without parsing the IR
+        self.model = core.compile_model(self.path, device)
+        self.input_names = {port.get_any_name() for port in self.model.inputs}
+        # A compiled model's implicit infer request is not thread-safe
+        self.lock = threading.Lock()
+
+    def embed(self, sentences, batch_size=BATCH_SIZE):
+        """(len(sentences), 384) float32 array of unit vectors, in input order."""
+        vectors = np.zeros((len(sentences), 384), dtype=np.float32)
+        # Batching sentences of similar length keeps padding, and wasted compute, low
+        order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            inputs, mask = encode(self.tokenizer, [sentences[i] for i in batch], self.input_names)
+            with self.lock:
+                hidden = self.model(inputs)[0]
+            pooled = (hidden * mask[..., None]).sum(axis=1) / np.maximum(mask.sum(axis=1, keepdims=True), 1)
+            vectors[batch] = pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+
+def get_engine():
+    """The process-wide embedding engine, loaded on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = EmbeddingEngine()
+    return _engine
+
+
+def embed_text(text):
+    """float16 embeddings of a submission's sentences, as stored with the submission."""
+    sentences = submission_sentences(text)
+    if not sentences:
+        return np.zeros((0, 384), dtype=np.float16)
+    return get_engine().embed(sentences).astype(np.float16)
+
+
+def semantic_scores(target, others, threshold=PARAPHRASE_SIMILARITY):
+    """Share of target's sentences that have a paraphrase in each other submission.
+
+    target is an (n, d) embedding array and others {submission_id: (m, d) array}. All
+    cohort sentences are compared in a single matrix product; a target sentence counts as
+    paraphrased when its closest sentence in the other submission reaches threshold.
+    """
+    ids = [submission_id for submission_id, vectors in others.items() if len(vectors)]
+    if not len(target) or not ids:
+        return {}
+    cohort = np.concatenate([others[submission_id] for submission_id in ids]).astype(np.float32)
+    similarity = target.astype(np.float32) @ cohort.T
+    starts = np.cumsum([0] + [len(others[submission_id]) for submission_id in ids[:-1]])
+    closest = np.maximum.reduceat(similarity, starts, axis=1)
+    return dict(zip(ids, (closest >= threshold).mean(axis=0).tolist()))
+
+
+class EmbeddingIndex:
+    """Sentence embeddings of each submission, one float16 array per row of the submissions database.
+
+    Every row records the model variant it was embedded with (see embedding_model); FP32 and
+    INT8 vectors are not compared with each other, so rows of another variant read as missing
+    and are re-embedded by the caller.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sentence_embeddings (
+                submission_id INTEGER PRIMARY KEY,
+                dim INTEGER NOT NULL,
+                vectors BLOB NOT NULL,
+                model TEXT NOT NULL DEFAULT ''
+            );
+        """)
+        # Rows stored before the model was recorded are of unknown variant, so they are re-embedded
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(sentence_embeddings)")}
+        if "model" not in columns:
+            conn.execute("ALTER TABLE sentence_embeddings ADD COLUMN model TEXT NOT NULL DEFAULT ''")
+
+    def add(self, submission_id, vectors, model=None):
+        """Must be called inside the caller's write transaction."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float16)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO sentence_embeddings (submission_id, dim, vectors, model) VALUES (?, ?, ?, ?)",
+            (submission_id, vectors.shape[1], vectors.tobytes(), model or embedding_model())
+        )
+
+    def vectors(self, submission_ids, model=None):
+        """Returns {submission_id: (n, dim) float16 array} for the ids that have embeddings from
+        model (by default the variant in use)."""
+        ids = list(set(submission_ids))
+        model = model or embedding_model()
+        vectors = {}
+        # Batched, to stay under SQLite's bound-parameter limit
+        for start in range(0, len(ids), QUERY_BATCH_SIZE):
+            batch = ids[start:start + QUERY_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            for submission_id, dim, blob in self.conn.execute(
+                f"SELECT submission_id, dim, vectors FROM sentence_embeddings "
+                f"WHERE submission_id IN ({placeholders}) AND model = ?", batch + [model]
+            ):
+                vectors[submission_id] = np.frombuffer(blob, dtype=np.float16).reshape(-1, dim)
+        return vectors
@@ -1,36 +1,31 @@
 from PIL import Image
-import io
-import os
+from utils.plag.jpeg_encode import MB, encode_jpeg
 
-def split_image_by_size(image_path, max_size_mb=19, min_height=200):
+def split_image_by_size(image_path, max_size_mb=19, min_height=200, quality=85):
     """Splits a tall image into vertical chunks under max_size_mb."""
     img = Image.open(image_path)
     width, height = img.size
+    max_bytes = max_size_mb * MB
     chunks = []
     y = 0
     while y < height:
         # Start with a reasonable chunk height
         chunk_height = min(2000, height - y)
-        while chunk_height >= min_height:
-            box = (0, y, width, y + chunk_height)
-            chunk = img.crop(box)
-            buffer = io.BytesIO()
-            chunk.save(buffer, format="JPEG", quality=85)
-            size_mb = buffer.tell() / (1024 * 1024)
-            if size_mb <= max_size_mb:
-                # Save chunk to disk
-                chunk_path = f"{image_path}_chunk_{len(chunks)}.jpg"
-                chunk.save(chunk_path, format="JPEG", quality=85)
-                chunks.append(chunk_path)
-                y += chunk_height
+        while True:
+            chunk = img.crop((0, y, width, y + chunk_height))
+            data = encode_jpeg(chunk, quality)
+            if len(data) <= max_bytes or chunk_height <= min_height:
                 break
-            chunk_height = int(chunk_height * 0.8)
-        else:
+            # Encoded size scales roughly with area, so jump straight to the estimated height
+            chunk_height = max(int(chunk_height * max_bytes / len(data) * 0.95), min_height)
+        if len(data) > max_bytes:
             # If even the smallest chunk is too big, resize it
-            chunk = img.crop((0, y, width, y + min_height))
-            chunk = chunk.resize((width, int(min_height * 0.8)), Image.LANCZOS)
-            chunk_path = f"{image_path}_chunk_{len(chunks)}.jpg"
-            chunk.save(chunk_path, format="JPEG", quality=70)
-            chunks.append(chunk_path)
-            y += min_height
+            chunk = chunk.resize((width, int(chunk_height * 0.8)), Image.LANCZOS)
+            data = encode_jpeg(chunk, 70)
+        # Write the buffer that was measured instead of encoding the chunk a second time
+        chunk_path = f"{image_path}_chunk_{len(chunks)}.jpg"
+        with open(chunk_path, "wb") as f:
+            f.write(data)
+        chunks.append(chunk_path)
+        y += chunk_height
     return chunks
@@ -0,0 +1,260 @@
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from utils.plag.artifacts import STITCHED_DIR, ArtifactStore
+from utils.plag.pipeline import ingest_submission
+from utils.plag.store import DB_PATH, SubmissionStore, utc_now
+
+load_dotenv()
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+WORKER_TIMEOUT = 30  # seconds without a heartbeat before a worker counts as dead
+HEARTBEAT_INTERVAL = 5
+# Workers heartbeat only once their (heavy) imports are done; no more are spawned for this long meanwhile
+WORKER_STARTUP_GRACE = 60
+WORKER_IDLE_EXIT = float(os.getenv("WORKER_IDLE_EXIT", "600"))  # idle seconds before a worker exits; 0 = never
+MAX_ATTEMPTS = 3  # a job whose worker died this many times is failed instead of retried
+
+
+class JobQueue:
+    """Persistent submission job queue in the submissions database.
+
+    Jobs move queued -> running -> done/failed. Workers claim jobs with BEGIN IMMEDIATE, so
+    each job goes to exactly one worker; jobs of workers that stop heartbeating are requeued.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                roll_no TEXT NOT NULL,
+                name TEXT NOT NULL,
+                pdf_path TEXT NOT NULL,
+                skip_duplicates INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'queued',
+                stage TEXT,
+                pages_rasterized INTEGER NOT NULL DEFAULT 0,
+                pages_ocr_done INTEGER NOT NULL DEFAULT 0,
+                pages_total INTEGER NOT NULL DEFAULT 0,
+                worker_id TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                submission_id INTEGER,
+                result TEXT,
+                error TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id);
+            CREATE TABLE IF NOT EXISTS job_workers (
+                id TEXT PRIMARY KEY,
+                pid INTEGER NOT NULL,
+                host TEXT NOT NULL,
+                last_seen REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS job_worker_spawns (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                spawned_at REAL NOT NULL
+            );
+        """)
+        # Creates the triggers that keep a queued job's PDF referenced until the job ends
+        ArtifactStore(self.conn)
+        # The worker's heartbeat thread shares this connection
+        self.lock = threading.RLock()
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def _update(self, job_id, **fields):
+        fields["updated_at"] = utc_now()
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self.lock:
+            self.conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def enqueue(self, roll_no, name, pdf_path, skip_duplicates=False):
+        """Queues a submission and returns its job id."""
+        now = utc_now()
+        with self.lock:
+            return self.conn.execute(
+                "INSERT INTO jobs (roll_no, name, pdf_path, skip_duplicates, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (roll_no, name, pdf_path, int(skip_duplicates), now, now)
+            ).lastrowid
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def jobs_for(self, roll_no, limit=5):
+        """Most recent jobs of a roll number, newest first."""
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(
+                "SELECT * FROM jobs WHERE roll_no = ? ORDER BY id DESC LIMIT ?", (roll_no, limit)
+            )]
+
+    def heartbeat(self, worker_id):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO job_workers VALUES (?, ?, ?, ?)",
+                (worker_id, os.getpid(), socket.gethostname(), time.time())
+            )
+
+    def live_workers(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM job_workers WHERE last_seen > ?", (time.time() - WORKER_TIMEOUT,)
+            ).fetchone()[0]
+
+    def take_spawn_lease(self):
+        """True if the caller should start workers: none are live and none were started within
+        WORKER_STARTUP_GRACE. Checked and recorded in one transaction, so concurrent callers get one lease."""
+        with self.transaction():
+            if self.live_workers() or self.conn.execute(
+                "SELECT 1 FROM job_worker_spawns WHERE spawned_at > ?", (time.time() - WORKER_STARTUP_GRACE,)
+            ).fetchone():
+                return False
+            self.conn.execute("INSERT OR REPLACE INTO job_worker_spawns VALUES (1, ?)", (time.time(),))
+        return True
+
+    def retire(self, worker_id):
+        """Removes worker_id from the live workers unless jobs are queued. Returns whether it did.
+
+        Runs in one transaction with the queue check, so a job enqueued meanwhile either keeps
+        this worker or sees no live workers and gets new ones from ensure_workers.
+        """
+        with self.transaction():
+            if self.conn.execute("SELECT 1 FROM jobs WHERE status = 'queued' LIMIT 1").fetchone():
+                return False
+            self.conn.execute("DELETE FROM job_workers WHERE id = ?", (worker_id,))
+        return True
+
+    def claim(self, worker_id):
+        """Takes the oldest queued job for worker_id, or returns None if there is none."""
+        with self.transaction():
+            # Requeue jobs whose worker stopped heartbeating (crashed or killed mid-job)
+            dead = time.time() - WORKER_TIMEOUT
+            self.conn.execute("""
+                UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                    error = CASE WHEN attempts >= ? THEN 'Worker died while processing the job' END,
+                    worker_id = NULL
+                WHERE status = 'running' AND worker_id NOT IN (SELECT id FROM job_workers WHERE last_seen > ?)
+            """, (MAX_ATTEMPTS, MAX_ATTEMPTS, dead))
+            row = self.conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', stage = 'starting', worker_id = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE id = ?",
+                (worker_id, utc_now(), row["id"])
+            )
+        return self.get(row["id"])
+
+    def progress(self, job_id, stage, done, total):
+        fields = {"stage": stage}
+        if stage == "rasterized":
+            fields.update(pages_rasterized=done, pages_total=total)
+        elif stage == "ocr":
+            fields.update(pages_ocr_done=done, pages_total=total)
+        self._update(job_id, **fields)
+
+    def finish(self, job_id, submission_id, result):
+        self._update(job_id, status="done", stage="done", submission_id=submission_id, result=json.dumps(result))
+
+    def fail(self, job_id, error):
+        self._update(job_id, status="failed", error=error)
+
+
+def process_job(queue, store, job):
+    submission_id, version, text, stats = ingest_submission(
+        store,
+        job["roll_no"],
+        job["name"],
+        job["pdf_path"],
+        os.path.join(STITCHED_DIR, f"{job['roll_no']}_job{job['id']}"),
+        skip_duplicates=bool(job["skip_duplicates"]),
+        on_progress=lambda stage, done, total: queue.progress(job["id"], stage, done, total)
+    )
+    queue.finish(job["id"], submission_id, {
+        "version": version,
+        "pages": stats["pages"],
+        "text_layer_pages": stats["text_layer_pages"],
+        "ocr_pages": stats["ocr_pages"],
+        "duplicates": store.flagged_pages(submission_id),
+    })
+
+
+def run_worker(poll_interval=1.0, idle_exit=WORKER_IDLE_EXIT):
+    """Processes queued jobs until killed, or until no job came for idle_exit seconds."""
+    os.makedirs(STITCHED_DIR, exist_ok=True)
+    worker_id = uuid.uuid4().hex
+    queue = JobQueue()
+    store = SubmissionStore(DB_PATH)
+    queue.heartbeat(worker_id)
+    retired = threading.Event()
+
+    def beat():
+        # OCR of one page batch can outlast WORKER_TIMEOUT, so heartbeats come from their own thread
+        while not retired.wait(HEARTBEAT_INTERVAL):
+            with queue.lock:
+                if not retired.is_set():
+                    queue.heartbeat(worker_id)
+
+    threading.Thread(target=beat, daemon=True).start()
+    last_job = time.monotonic()
+    while True:
+        job = queue.claim(worker_id)
+        if job is None:
+            if idle_exit and time.monotonic() - last_job > idle_exit:
+                with queue.lock:
+                    if queue.retire(worker_id):
+                        retired.set()
+                        break
+            time.sleep(poll_interval)
+            continue
+        try:
+            process_job(queue, store, job)
+        except Exception as e:
+            queue.fail(job["id"], f"{type(e).__name__}: {e}")
+        last_job = time.monotonic()
+    store.close()
+    queue.close()
+
+
+def ensure_workers(count=JOB_WORKERS):
+    """Starts count detached worker processes unless workers are already running or starting.
+    Returns the number started."""
+    queue = JobQueue()
+    try:
+        if not queue.take_spawn_lease():
+            return 0
+    finally:
+        queue.close()
+    for _ in range(count):
+        # A new session keeps workers alive across Streamlit reruns and restarts
+        subprocess.Popen([sys.executable, "-m", "utils.plag.jobs"], start_new_session=True,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return count
+
+
+if __name__ == "__main__":
+    run_worker()
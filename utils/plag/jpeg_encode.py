@@ -0,0 +1,83 @@
+from PIL import Image
+import io
+
+MB = 1024 * 1024
+
+
+def encode_jpeg(img, quality):
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+# Typical JPEG size at each quality relative to quality 95, measured on scanned assignment pages
+SIZE_CURVE = [(30, 0.27), (40, 0.31), (50, 0.35), (60, 0.40), (70, 0.46), (80, 0.55), (85, 0.63), (90, 0.77), (95, 1.0)]
+
+
+def _relative_size(quality):
+    if quality <= SIZE_CURVE[0][0]:
+        return SIZE_CURVE[0][1]
+    for (q0, r0), (q1, r1) in zip(SIZE_CURVE, SIZE_CURVE[1:]):
+        if quality <= q1:
+            return r0 + (r1 - r0) * (quality - q0) / (q1 - q0)
+    return SIZE_CURVE[-1][1]
+
+
+def fit_quality(img, max_bytes, min_quality=30, max_quality=95, step=5):
+    """Largest JPEG quality on the grid max_quality, max_quality - step, ..., min_quality
+    whose encoding fits max_bytes.
+
+    Returns (data, quality), or (None, min_quality_data) if even min_quality is too big.
+    Each probe is the quality predicted to fit from SIZE_CURVE, rescaled to the last
+    measured size, inside a shrinking bracket, so a fit usually takes about three encodes.
+    """
+    grid = sorted(set(range(max_quality, min_quality, -step)) | {min_quality})
+    data = encode_jpeg(img, max_quality)
+    if len(data) <= max_bytes:
+        return data, max_quality
+    # lo: best index known to fit (-1 while none is); hi: lowest index known to be too big
+    lo, hi = -1, len(grid) - 1
+    best = None
+    scale = len(data) / _relative_size(max_quality)
+    while hi - lo > 1:
+        predicted = [i for i in range(lo + 1, hi) if scale * _relative_size(grid[i]) <= max_bytes]
+        i = predicted[-1] if predicted else lo + 1
+        data = encode_jpeg(img, grid[i])
+        if len(data) <= max_bytes:
+            lo, best = i, (data, grid[i])
+        else:
+            hi = i
+        scale = len(data) / _relative_size(grid[i])
+    # hi only ever takes probed indices, so without a fit the last encode was at min_quality
+    return best if best else (None, data)
+
+
+def encode_under_size(img, max_bytes, min_quality=30, max_quality=95, min_width=500):
+    """Encodes img as the best JPEG under max_bytes: highest quality first, then the largest
+    size at min_quality. Returns (data, quality, (width, height))."""
+    data, result = fit_quality(img, max_bytes, min_quality, max_quality)
+    if data is not None:
+        return data, result, img.size
+    data = result
+    size = len(data)
+    width = img.width
+    original = img
+    while width > min_width:
+        # Encoded size scales roughly with pixel area; aim a little under the budget
+        scale = min((max_bytes / size) ** 0.5 * 0.95, 0.95)
+        width = max(int(width * scale), min_width)
+        height = max(int(original.height * width / original.width), 1)
+        img = original.resize((width, height), Image.LANCZOS)
+        data = encode_jpeg(img, min_quality)
+        size = len(data)
+        if size <= max_bytes:
+            break
+    return data, min_quality, img.size
+
+
+def save_jpeg_under_size(img, output_path, max_size_mb=19, min_quality=30, max_quality=95):
+    """Encodes img under max_size_mb and writes the winning buffer as-is (no second encode)."""
+    data, _, _ = encode_under_size(img, max_size_mb * MB, min_quality, max_quality)
+    with open(output_path, "wb") as f:
+        f.write(data)
+    return output_path
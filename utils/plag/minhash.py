@@ -0,0 +1,65 @@
+from collections import defaultdict
+import heapq
+import numpy as np
+
+NUM_PERM = 128
+SEED = 25
+
+
+def _hash_params(num_perm=NUM_PERM, seed=SEED):
+    rng = np.random.default_rng(seed)
+    masks = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+    # Odd multipliers keep the multiply-shift hash a bijection on uint64
+    mults = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    return masks, mults
+
+
+def minhash_signature(hashes, params):
+    """MinHash signature of a set of hex sentence hashes."""
+    masks, mults = params
+    values = np.array([int(h, 16) for h in hashes], dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        permuted = (values[:, None] ^ masks[None, :]) * mults[None, :]
+    return permuted.min(axis=0)
+
+
+def choose_bands(num_perm, threshold):
+    """Picks (bands, rows) so the LSH S-curve threshold (1/b)^(1/r) sits just below threshold."""
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        # Leave some headroom so pairs right at the threshold are still likely candidates
+        if (1 / bands) ** (1 / rows) <= threshold * 0.8:
+            best = (bands, rows)
+    return best
+
+
+def candidate_pairs(signatures, bands, rows):
+    """Pairs of ids whose signatures collide in at least one band."""
+    pairs = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for doc_id, sig in signatures.items():
+            buckets[sig[band * rows:(band + 1) * rows].tobytes()].append(doc_id)
+        for members in buckets.values():
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    pairs.add((members[i], members[j]))
+    return pairs
+
+
+def scan_cohort(docs, threshold, top_k=20, num_perm=NUM_PERM):
+    """Top-k most similar pairs of {doc_id: sentence hashes} with exact Jaccard >= threshold (0-1)."""
+    docs = {doc_id: set(hashes) for doc_id, hashes in docs.items() if hashes}
+    params = _hash_params(num_perm)
+    signatures = {doc_id: minhash_signature(hashes, params) for doc_id, hashes in docs.items()}
+    bands, rows = choose_bands(num_perm, max(threshold, 0.01))
+    scored = []
+    for a, b in candidate_pairs(signatures, bands, rows):
+        shared = len(docs[a] & docs[b])
+        jaccard = shared / (len(docs[a]) + len(docs[b]) - shared)
+        if jaccard >= threshold:
+            scored.append((jaccard, a, b))
+    return [(a, b, jaccard) for jaccard, a, b in heapq.nlargest(top_k, scored)]
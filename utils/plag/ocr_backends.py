@@ -0,0 +1,100 @@
+import os
+import threading
+from dotenv import load_dotenv
+from utils.plag.vision import extract_text_from_images
+
+load_dotenv()
+# remote: vision LLM only; local: easyocr only; auto: easyocr first, vision LLM for low-confidence chunks
+OCR_BACKEND = os.getenv("OCR_BACKEND", "remote")
+OCR_LOCAL_LANGS = os.getenv("OCR_LOCAL_LANGS", "en").split(",")
+OCR_LOCAL_WORKERS = int(os.getenv("OCR_LOCAL_WORKERS", "2"))
+OCR_LOCAL_BATCH_SIZE = int(os.getenv("OCR_LOCAL_BATCH_SIZE", "16"))
+OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "0.6"))
+POLICIES = ("remote", "local", "auto")
+
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def get_reader():
+    """The process-wide easyocr reader, loaded on first use and shared by all OCR workers."""
+    global _reader
+    with _reader_lock:
+        if _reader is None:
+            import easyocr
+            import torch
+            # Workers share the CPU; give each its slice of threads instead of oversubscribing
+            torch.set_num_threads(max((os.cpu_count() or 1) // OCR_LOCAL_WORKERS, 1))
+            _reader = easyocr.Reader(OCR_LOCAL_LANGS, gpu=False, verbose=False)
+    return _reader
+
+
+def _join_lines(detections):
+    """Reassembles easyocr word boxes into lines of text, top to bottom and left to right."""
+    lines = []
+    for box, text, _ in sorted(detections, key=lambda d: min(y for _, y in d[0])):
+        top = min(y for _, y in box)
+        bottom = max(y for _, y in box)
+        left = min(x for x, _ in box)
+        # A box that starts above the middle of the current line belongs to it
+        if lines and top < lines[-1]["bottom"] - (bottom - top) / 2:
+            lines[-1]["words"].append((left, text))
+            lines[-1]["bottom"] = max(lines[-1]["bottom"], bottom)
+        else:
+            lines.append({"bottom": bottom, "words": [(left, text)]})
+    return "\n".join(" ".join(text for _, text in sorted(line["words"])) for line in lines)
+
+
+class LocalOCR:
+    """Offline OCR with easyocr on the CPU. Good on typed text, weak on handwriting."""
+
+    name = "local"
+    rate_limited = False
+
+    def read(self, image_paths):
+        """(text, confidence) for each image, in order. Confidence is the character-weighted
+        mean over detected words, 0 when nothing was detected."""
+        reader = get_reader()
+        results = []
+        for path in image_paths:
+            detections = reader.readtext(path, batch_size=OCR_LOCAL_BATCH_SIZE)
+            chars = sum(len(text) for _, text, _ in detections)
+            confidence = sum(len(text) * conf for _, text, conf in detections) / chars if chars else 0.0
+            results.append((_join_lines(detections), confidence))
+        return results
+
+
+class RemoteOCR:
+    """The Groq vision LLM (see vision.py). It reports no confidence.
+
+    lookup(image_paths), if given, returns the already known texts (None for the others)
+    without making a request, so callers can rate-limit only the misses.
+    """
+
+    name = "remote"
+    rate_limited = True
+
+    def __init__(self, ocr=extract_text_from_images, lookup=None):
+        self.ocr = ocr
+        self.lookup = lookup
+
+    def read(self, image_paths):
+        return [(text, None) for text in self.ocr(image_paths)]
+
+    def cached(self, image_paths):
+        """(text, None) for each image already known, None for the ones read must request."""
+        texts = self.lookup(image_paths) if self.lookup else [None] * len(image_paths)
+        return [(text, None) if text is not None else None for text in texts]
+
+
+def get_backends(policy=None, remote_ocr=extract_text_from_images, lookup=None):
+    """(primary, fallback) backends for an OCR policy; fallback is None unless policy is 'auto'."""
+    policy = policy or OCR_BACKEND
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown OCR policy {policy!r}, expected one of {', '.join(POLICIES)}")
+    remote = RemoteOCR(remote_ocr, lookup)
+    if policy == "remote":
+        return remote, None
+    if policy == "local":
+        return LocalOCR(), None
+    return LocalOCR(), remote
@@ -0,0 +1,39 @@
+import hashlib
+import os
+from dotenv import load_dotenv
+from utils.sqlite_cache import SQLiteCache, shared
+
+load_dotenv()
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "ocr_cache.db")
+OCR_CACHE_MAX_MB = float(os.getenv("OCR_CACHE_MAX_MB", "256"))
+
+
+def cache_key(image_path, model, prompt):
+    """Content address of an OCR result: image bytes plus everything that shapes the model's answer."""
+    digest = hashlib.sha256()
+    with open(image_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(b"\0" + model.encode("utf-8") + b"\0" + prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class OCRCache(SQLiteCache):
+    """Disk-backed OCR results, evicted least recently used beyond max_bytes."""
+
+    table = "ocr_results"
+    columns = "text TEXT NOT NULL"
+    stats_table = "ocr_stats"
+
+    def __init__(self, path=OCR_CACHE_PATH, max_bytes=OCR_CACHE_MAX_MB * 1024 * 1024):
+        super().__init__(path, max_bytes=max_bytes)
+
+    def get(self, key):
+        row = self._lookup(key, "text")
+        return row[0] if row else None
+
+    def put(self, key, text):
+        self._store(key, size=len(text.encode("utf-8")), text=text)
+
+
+get_ocr_cache = shared(OCRCache)
@@ -0,0 +1,161 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from dotenv import load_dotenv
+from utils.plag.ocr_backends import OCR_LOCAL_WORKERS, OCR_MIN_CONFIDENCE, get_backends
+from utils.plag.vision import BatchMismatchError, batch_images, cached_texts, extract_text_from_images
+
+load_dotenv()
+# Overridable from .env: how many chunks are OCR'd at once and the vision API request budget
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", "4"))
+OCR_REQUESTS_PER_MINUTE = float(os.getenv("OCR_REQUESTS_PER_MINUTE", "30"))
+OCR_MAX_RETRIES = int(os.getenv("OCR_MAX_RETRIES", "4"))
+
+
+class TokenBucket:
+    """Thread-safe token bucket: allows bursts of `capacity` requests, refilled at `rate` per second."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _retry_after(error):
+    """Seconds to wait before retrying error, or None if it should not be retried."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        # Connection errors and timeouts carry no status code but are worth retrying
+        if type(error).__name__ in ("APIConnectionError", "APITimeoutError"):
+            return 0
+        return None
+    if status != 429 and status < 500:
+        return None
+    response = getattr(error, "response", None)
+    header = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(header) if header else 0
+    except ValueError:
+        return 0
+
+
+def call_with_retry(call, bucket, max_retries=OCR_MAX_RETRIES, backoff=1.0):
+    """call() once bucket allows, retried on rate limits (429), server errors and dropped connections."""
+    for attempt in range(max_retries + 1):
+        bucket.acquire()
+        try:
+            return call()
+        except Exception as e:
+            wait = _retry_after(e)
+            if wait is None or attempt == max_retries:
+                raise
+            # Exponential backoff with jitter, but never sooner than the server asked for
+            time.sleep(max(wait, backoff * 2 ** attempt * random.uniform(0.5, 1.5)))
+
+
+def _ocr_with_retry(image_paths, ocr, bucket, max_retries, backoff):
+    try:
+        return call_with_retry(partial(ocr, image_paths), bucket, max_retries, backoff)
+    except BatchMismatchError:
+        if len(image_paths) == 1:
+            raise
+        # The batched answer was unusable: send each image as its own request, each through the bucket
+        return [text for path in image_paths for text in _ocr_with_retry([path], ocr, bucket, max_retries, backoff)]
+
+
+def _read(backend, image_paths, bucket, max_retries, backoff):
+    if not backend.rate_limited:
+        return backend.read(image_paths)
+    # Cached chunks cost no request, so only the misses take rate-limit tokens
+    results = backend.cached(image_paths)
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        fresh = _ocr_with_retry([image_paths[i] for i in missing], backend.read, bucket, max_retries, backoff)
+        for i, result in zip(missing, fresh):
+            results[i] = result
+    return results
+
+
+def _ocr_batch(image_paths, primary, fallback, bucket, max_retries, backoff):
+    results = _read(primary, image_paths, bucket, max_retries, backoff)
+    texts = [text for text, _ in results]
+    unsure = [i for i, (_, confidence) in enumerate(results)
+              if confidence is not None and confidence < OCR_MIN_CONFIDENCE]
+    if fallback and unsure:
+        retried = _read(fallback, [image_paths[i] for i in unsure], bucket, max_retries, backoff)
+        for i, (text, _) in zip(unsure, retried):
+            texts[i] = text
+    return texts
+
+
+def ocr_chunks(chunk_paths, ocr=None, max_workers=None, requests_per_minute=None, max_retries=None, backoff=1.0,
+               on_progress=None, batch=True, total=None, policy=None, bucket=None, lookup=None):
+    """OCRs image chunks concurrently and returns their texts in chunk order.
+
+    chunk_paths may be a generator (e.g. pdf_to_page_chunks): batches are dispatched as soon
+    as they fill, so OCR overlaps rasterization; pass total for progress reporting. With
+    batch=True, chunks are packed several per vision request (see batch_images); ocr takes
+    a list of paths and returns their texts, and may raise BatchMismatchError to have each
+    path sent as its own rate-limited request. on_progress(done, total) counts chunks and
+    is called from the calling thread, so it can update Streamlit widgets.
+
+    policy picks the OCR backend (see ocr_backends.OCR_BACKEND): 'remote' sends chunks to
+    ocr, 'local' reads them with easyocr, 'auto' reads them locally and sends only
+    low-confidence chunks to ocr. Only requests to ocr count against the rate limit; pass
+    a shared TokenBucket as bucket to hold concurrent calls to one combined rate.
+
+    ocr defaults to the vision model. Chunks found by lookup(paths) (texts, None for misses;
+    the OCR cache for the vision model) are not sent to ocr and take no rate-limit token, so
+    a fully cached resubmission is not throttled.
+    """
+    if ocr is None:
+        ocr = partial(extract_text_from_images, split_on_mismatch=False, check_cache=False)
+        lookup = lookup or cached_texts
+    primary, fallback = get_backends(policy, ocr, lookup)
+    max_workers = max_workers or (OCR_MAX_WORKERS if primary.rate_limited else OCR_LOCAL_WORKERS)
+    rate = (requests_per_minute or OCR_REQUESTS_PER_MINUTE) / 60
+    max_retries = OCR_MAX_RETRIES if max_retries is None else max_retries
+    bucket = bucket or TokenBucket(rate, capacity=max_workers)
+    batches = batch_images(chunk_paths) if batch else ([path] for path in chunk_paths)
+    futures = {}
+    results = {}
+    done = 0
+
+    def collect(finished):
+        nonlocal done
+        for future in finished:
+            i, size = futures.pop(future)
+            results[i] = future.result()
+            done += size
+            if on_progress:
+                on_progress(done, total or done)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        try:
+            for i, paths in enumerate(batches):
+                futures[pool.submit(_ocr_batch, paths, primary, fallback, bucket, max_retries, backoff)] = (i, len(paths))
+                collect([future for future in list(futures) if future.done()])
+            collect(as_completed(list(futures)))
+        except BaseException:
+            # One batch failed for good; don't spend quota on the rest
+            for future in futures:
+                future.cancel()
+            raise
+    return [text for i in sorted(results) for text in results[i]]
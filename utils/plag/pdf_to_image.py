@@ -1,33 +1,14 @@
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 from PIL import Image
+from utils.plag.jpeg_encode import save_jpeg_under_size
+from utils.plag.phash import page_hash
+from utils.plag.preprocess import PREVIEW_DPI, choose_dpi, clean_page
 import os
-import io
 
 
 def compress_image_to_size(img, output_path, max_size_mb=19, min_quality=30):
     """Compress and save image to be under max_size_mb."""
-    quality = 95
-    while quality >= min_quality:
-        buffer = io.BytesIO()
-        img.save(buffer, format="JPEG", quality=quality)
-        size_mb = buffer.tell() / (1024 * 1024)
-        if size_mb <= max_size_mb:
-            with open(output_path, "wb") as f:
-                f.write(buffer.getvalue())
-            return output_path
-        quality -= 10
-    # If still too big, resize and try again
-    width, height = img.size
-    while size_mb > max_size_mb and width > 500:
-        width = int(width * 0.9)
-        height = int(height * 0.9)
-        img = img.resize((width, height), Image.LANCZOS)
-        buffer = io.BytesIO()
-        img.save(buffer, format="JPEG", quality=min_quality)
-        size_mb = buffer.tell() / (1024 * 1024)
-    with open(output_path, "wb") as f:
-        f.write(buffer.getvalue())
-    return output_path
+    return save_jpeg_under_size(img, output_path, max_size_mb=max_size_mb, min_quality=min_quality)
 
 
 def pdf_to_stitched_image(pdf_path, output_path, poppler_path=None):
@@ -60,6 +41,83 @@ def pdf_to_stitched_image(pdf_path, output_path, poppler_path=None):
     return compress_image_to_size(stitched_img, output_path, max_size_mb=19)
 
 
+def pdf_page_count(pdf_path, poppler_path=None):
+    kwargs = {}
+    if poppler_path:
+        kwargs['poppler_path'] = poppler_path
+    return pdfinfo_from_path(pdf_path, **kwargs)["Pages"]
+
+
+def _page_ranges(pages, max_length):
+    """Splits sorted page numbers into (first, last) runs of consecutive pages, at most max_length long."""
+    ranges = []
+    for number in pages:
+        if ranges and number == ranges[-1][1] + 1 and number - ranges[-1][0] < max_length:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+    return ranges
+
+
+def iter_pdf_pages(pdf_path, poppler_path=None, pages_per_render=2, pages=None, **render_kwargs):
+    """Yields (page_number, image) while rendering only pages_per_render pages at a time,
+    so memory stays bounded by page size instead of document size. pages restricts
+    rendering to those 1-based page numbers; render_kwargs (dpi, grayscale, ...) are
+    passed to pdf2image."""
+    kwargs = dict(render_kwargs)
+    if poppler_path:
+        kwargs['poppler_path'] = poppler_path
+    if pages is None:
+        page_count = pdf_page_count(pdf_path, poppler_path)
+        if not page_count:
+            raise ValueError("No pages found in PDF.")
+        pages = range(1, page_count + 1)
+    for first, last in _page_ranges(sorted(pages), pages_per_render):
+        for offset, page in enumerate(convert_from_path(pdf_path, first_page=first, last_page=last, **kwargs)):
+            yield first + offset, page
+
+
+def pdf_to_page_chunks(pdf_path, output_prefix, poppler_path=None, max_size_mb=19, preprocess=True, bilevel=False, pages=None,
+                       skip_page=None):
+    """Streaming alternative to pdf_to_stitched_image + split_image_by_size.
+
+    Yields (page_number, path) for one OCR-ready JPEG per page ({output_prefix}_page_{n}.jpg)
+    as soon as it is rendered. pages restricts the output to those 1-based page numbers.
+    Page-aligned chunks are byte-identical across resubmissions of unchanged pages, so
+    their OCR results can be served from the cache.
+
+    With preprocess=True each page is first previewed at low resolution: blank pages are
+    skipped and the render DPI is picked from the size of the writing. The page is then
+    rendered in grayscale, its background flattened to white, margins trimmed and tall
+    blank bands collapsed (see utils.plag.preprocess), which shrinks OCR uploads severalfold.
+
+    skip_page(page_number, page_hash) is called with the perceptual hash of every non-blank
+    page (see utils.plag.phash) before it is rendered for OCR; a true result drops the page.
+    """
+    if not preprocess:
+        for number, page in iter_pdf_pages(pdf_path, poppler_path, pages=pages):
+            if skip_page and skip_page(number, page_hash(page)):
+                continue
+            yield number, compress_image_to_size(page.convert('RGB'), f"{output_prefix}_page_{number}.jpg", max_size_mb=max_size_mb)
+        return
+    kwargs = {}
+    if poppler_path:
+        kwargs['poppler_path'] = poppler_path
+    for number, preview in iter_pdf_pages(pdf_path, poppler_path, pages_per_render=8, pages=pages, dpi=PREVIEW_DPI, grayscale=True):
+        dpi = choose_dpi(preview)
+        if dpi is None:
+            continue
+        # The preview is enough to recognise a rescan, so duplicates are caught before the full render
+        if skip_page and skip_page(number, page_hash(preview)):
+            continue
+        page = convert_from_path(pdf_path, dpi=dpi, first_page=number, last_page=number, grayscale=True, **kwargs)[0]
+        page = clean_page(page, dpi, bilevel=bilevel)
+        if page is None:
+            continue
+        # Cleaned pages are flat white with dark strokes; quality 85 loses nothing the OCR needs
+        yield number, save_jpeg_under_size(page, f"{output_prefix}_page_{number}.jpg", max_size_mb=max_size_mb, max_quality=85)
+
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) < 3:
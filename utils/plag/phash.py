@@ -0,0 +1,132 @@
+import numpy as np
+from PIL import Image
+from utils.plag.preprocess import INK_LEVEL, flatten_background
+
+HASH_SIZE = 8  # 8x8 low-frequency DCT coefficients -> 64-bit hash
+DCT_SIZE = 32
+BANDS = 8  # multi-index hashing: 8 bands of 8 bits
+# Hamming distance at which two page scans count as the same page; must stay below 2 * BANDS.
+# The margin is thin: on test-assignments/ the closest pair of different pages (pages 7 and 9 of
+# OE ASSIGNMENT 2.pdf, same typed layout) is 12 bits apart, the copied page 0 bits.
+MAX_DISTANCE = 10
+# A flagged page is left out of OCR (skip_duplicates) only when this close; a false skip loses the page's text
+SKIP_MAX_DISTANCE = 4
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    return np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n))
+
+
+_DCT = _dct_matrix(DCT_SIZE)
+
+
+def _signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def page_hash(page):
+    """64-bit perceptual hash (DCT pHash) of a page image, as a signed integer, or None for a blank page.
+
+    The paper background is flattened and the page cropped to its ink first, so rescans and
+    photocopies of the same sheet hash alike despite different lighting, margins and resolution.
+    """
+    pixels = flatten_background(page.convert("L"))
+    ink = pixels < INK_LEVEL
+    # Specks and scanner noise must not move the crop, so a row or column needs some real ink
+    rows = np.flatnonzero(ink.sum(axis=1) > ink.shape[1] * 0.005)
+    cols = np.flatnonzero(ink.sum(axis=0) > ink.shape[0] * 0.005)
+    if not len(rows) or not len(cols):
+        return None
+    content = Image.fromarray(pixels[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1])
+    # Box filtering averages ink density per cell, which rotation, blur and noise barely change
+    small = np.asarray(content.resize((DCT_SIZE, DCT_SIZE), Image.BOX), dtype=np.float64)
+    low = (_DCT @ small @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].flatten()
+    # The DC term only measures overall darkness; leave it out of the median
+    bits = low > np.median(low[1:])
+    return _signed(int("".join("1" if bit else "0" for bit in bits), 2))
+
+
+def hamming(a, b):
+    return ((a ^ b) & ((1 << 64) - 1)).bit_count()
+
+
+def band_keys(h):
+    """One lookup key per 8-bit band of h."""
+    h &= (1 << 64) - 1
+    return [band * 256 + ((h >> (8 * band)) & 0xFF) for band in range(BANDS)]
+
+
+def probe_keys(h):
+    """Band keys of h and of every value one bit away within a band. Two hashes less than
+    2 * BANDS bits apart differ by at most one bit in some band, so a page within
+    MAX_DISTANCE always shares one of these keys."""
+    return [key ^ (1 << bit) if bit is not None else key
+            for key in band_keys(h) for bit in (None, *range(8))]
+
+
+class PageHashIndex:
+    """Multi-index hash table of page hashes, kept in the submissions database.
+
+    A lookup fetches only the pages that share a band with the query, so finding near-duplicate
+    pages does not scan every stored page.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS page_hashes (
+                id INTEGER PRIMARY KEY,
+                submission_id INTEGER NOT NULL,
+                page INTEGER NOT NULL,
+                hash INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_page_hashes_submission ON page_hashes (submission_id);
+            CREATE TABLE IF NOT EXISTS page_hash_bands (
+                key INTEGER NOT NULL,
+                page_hash_id INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_page_hash_bands_key ON page_hash_bands (key);
+            CREATE TABLE IF NOT EXISTS page_duplicates (
+                submission_id INTEGER NOT NULL,
+                page INTEGER NOT NULL,
+                other_submission_id INTEGER NOT NULL,
+                other_page INTEGER NOT NULL,
+                distance INTEGER NOT NULL,
+                skipped INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_page_duplicates_submission ON page_duplicates (submission_id);
+        """)
+
+    def add(self, submission_id, page_hashes):
+        """page_hashes is {page_number: hash}. Must be called inside the caller's write transaction."""
+        for page, h in page_hashes.items():
+            page_hash_id = self.conn.execute(
+                "INSERT INTO page_hashes (submission_id, page, hash) VALUES (?, ?, ?)", (submission_id, page, h)
+            ).lastrowid
+            self.conn.executemany(
+                "INSERT INTO page_hash_bands VALUES (?, ?)", [(key, page_hash_id) for key in band_keys(h)]
+            )
+
+    def add_duplicates(self, submission_id, duplicates, skipped_pages=()):
+        """Records the pages flagged as copies at ingest: duplicates is {page_number: [match]}
+        (see SubmissionStore.duplicate_pages). Must be called inside the caller's write transaction."""
+        self.conn.executemany("INSERT INTO page_duplicates VALUES (?, ?, ?, ?, ?, ?)", [
+            (submission_id, page, match["submission_id"], match["page"], match["distance"], int(page in skipped_pages))
+            for page, matches in duplicates.items() for match in matches
+        ])
+
+    def near(self, h, max_distance=MAX_DISTANCE):
+        """Stored pages within max_distance bits of h, as [(submission_id, page, distance)], closest first."""
+        keys = probe_keys(h)
+        placeholders = ",".join("?" * len(keys))
+        matches = []
+        for submission_id, page, other in self.conn.execute(f"""
+            SELECT submission_id, page, hash FROM page_hashes
+            WHERE id IN (SELECT page_hash_id FROM page_hash_bands WHERE key IN ({placeholders}))
+        """, keys):
+            distance = hamming(h, other)
+            if distance <= max_distance:
+                matches.append((submission_id, page, distance))
+        return sorted(matches, key=lambda match: match[2])
@@ -0,0 +1,110 @@
+from utils.plag.artifacts import discard_chunks
+from utils.plag.embeddings import embed_text, semantic_available
+from utils.plag.ocr_pool import ocr_chunks
+from utils.plag.pdf_to_image import pdf_to_page_chunks
+from utils.plag.phash import SKIP_MAX_DISTANCE
+from utils.plag.text_layer import extract_text_layer
+
+
+def merge_page_texts(layer, page_texts):
+    """Submission text from the text layer (see extract_text_layer) and {page_number: OCR text}, in page order."""
+    texts = {number: text for number, text in enumerate(layer, start=1) if text is not None}
+    texts.update(page_texts)
+    return "".join(texts[number] + "\n" for number in sorted(texts) if texts[number])
+
+
+def extract_submission_text(pdf_path, chunk_prefix, on_progress=None, find_duplicates=None, skip_duplicates=False,
+                            on_rasterized=None):
+    """Text of a submission PDF, page by page: the embedded text layer where it is usable,
+    vision OCR for scanned or handwritten pages only.
+
+    Returns (text, stats) where stats counts pages, text-layer pages and OCR'd pages, and
+    holds the perceptual hash of every scanned page ({page_number: hash}, for the store).
+    on_progress(done, total) reports OCR progress over the pages that need it, and
+    on_rasterized(done, total) the pages rendered for OCR so far.
+
+    find_duplicates(page_hash) returns the stored pages a scanned page is a near-copy of;
+    pages with matches are listed in stats["duplicates"]. With skip_duplicates, pages with a
+    match within SKIP_MAX_DISTANCE are left out of OCR (and of the text) and listed in
+    stats["skipped_pages"]; looser matches are only flagged. Page chunks are deleted once OCR is done (see
+    utils.plag.artifacts.discard_chunks).
+    """
+    layer = extract_text_layer(pdf_path)
+    ocr_pages = [number for number, text in enumerate(layer, start=1) if text is None]
+    ocr_texts = []
+    page_hashes = {}
+    duplicates = {}
+    skipped_pages = set()
+    if ocr_pages:
+        chunk_pages = []
+        chunk_paths = []
+
+        def skip_page(number, page_hash):
+            if page_hash is None:
+                return False
+            page_hashes[number] = page_hash
+            matches = find_duplicates(page_hash) if find_duplicates else []
+            if matches:
+                duplicates[number] = matches
+            # Matches near MAX_DISTANCE can be a different page of the same template; only close ones are skipped
+            if skip_duplicates and any(match["distance"] <= SKIP_MAX_DISTANCE for match in matches):
+                skipped_pages.add(number)
+                return True
+            return False
+
+        def chunks():
+            for number, path in pdf_to_page_chunks(pdf_path, chunk_prefix, pages=ocr_pages, skip_page=skip_page):
+                chunk_pages.append(number)
+                chunk_paths.append(path)
+                if on_rasterized:
+                    on_rasterized(len(chunk_pages), len(ocr_pages))
+                yield path
+
+        try:
+            ocr_texts = ocr_chunks(chunks(), total=len(ocr_pages), on_progress=on_progress)
+        finally:
+            discard_chunks(chunk_paths)
+        page_texts = dict(zip(chunk_pages, ocr_texts))
+    else:
+        page_texts = {}
+    text = merge_page_texts(layer, page_texts)
+    stats = {
+        "pages": len(layer),
+        "text_layer_pages": len(layer) - len(ocr_pages),
+        "ocr_pages": len(ocr_texts),
+        "page_hashes": page_hashes,
+        "duplicates": duplicates,
+        "skipped_pages": skipped_pages,
+    }
+    return text, stats
+
+
+def store_submission(store, roll_no, name, pdf_path, text, page_hashes, duplicates=None, skipped_pages=()):
+    """Adds an extracted submission, with its flagged duplicate pages, to the store. Returns (id, version)."""
+    # Sentence hashes, fingerprints and embeddings are computed once here, at ingest
+    embeddings = embed_text(text) if semantic_available() else None
+    return store.add_submission(roll_no, name, pdf_path, None, text, page_hashes=page_hashes, embeddings=embeddings,
+                                page_duplicates=duplicates, skipped_pages=skipped_pages)
+
+
+def ingest_submission(store, roll_no, name, pdf_path, chunk_prefix, skip_duplicates=False, on_progress=None):
+    """Extracts, indexes and stores one submission. Returns (submission_id, version, text, stats).
+
+    on_progress(stage, done, total) is called with stage "rasterized" and "ocr" (pages)
+    while text is extracted and with "indexing" before the submission is stored.
+    """
+    report = on_progress or (lambda stage, done, total: None)
+    # Scanned pages are compared with every other student's pages by perceptual hash before OCR
+    text, stats = extract_submission_text(
+        pdf_path,
+        chunk_prefix,
+        on_progress=lambda done, total: report("ocr", done, total),
+        find_duplicates=lambda page_hash: store.duplicate_pages(page_hash, roll_no),
+        skip_duplicates=skip_duplicates,
+        on_rasterized=lambda done, total: report("rasterized", done, total)
+    )
+    report("indexing", 0, 1)
+    submission_id, version = store_submission(store, roll_no, name, pdf_path, text, stats["page_hashes"],
+                                              stats["duplicates"], stats["skipped_pages"])
+    report("indexing", 1, 1)
+    return submission_id, version, text, stats
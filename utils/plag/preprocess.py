@@ -0,0 +1,94 @@
+import numpy as np
+from PIL import Image, ImageFilter
+
+PREVIEW_DPI = 72
+MIN_DPI = 120
+MAX_DPI = 200
+TARGET_LINE_PITCH_PX = 56  # rendered line spacing at which the vision model still reads text reliably
+INK_LEVEL = 140  # after flattening, pixels darker than this are ink
+WHITE_LEVEL = 190  # ...and pixels lighter than this are paper
+BLANK_INK_RATIO = 0.002
+MAX_GAP_INCHES = 0.3  # blank bands taller than this are collapsed to this height
+PAD_INCHES = 0.1
+
+
+def flatten_background(gray):
+    """Divides out the paper colour and uneven lighting of a phone scan so the paper becomes white."""
+    background = gray.reduce(8).filter(ImageFilter.MaxFilter(5)).resize(gray.size, Image.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.float32)
+    flat = pixels / np.maximum(np.asarray(background, dtype=np.float32), 1) * 255
+    flat[flat > WHITE_LEVEL] = 255
+    return np.clip(flat, 0, 255).astype(np.uint8)
+
+
+def _runs(mask):
+    """(start, end) of every run of True values in a 1-D boolean array."""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return list(zip(edges[::2], edges[1::2]))
+
+
+def _content_rows(ink):
+    # A margin rule or speck is not content; a row needs ink across some of the page
+    return ink.sum(axis=1) > ink.shape[1] * 0.005
+
+
+def line_pitch(ink, min_px=5, max_px=80):
+    """Distance in pixels between text lines, from the autocorrelation of the row ink profile.
+
+    Takes the first strong peak rather than the highest one, so a multiple of the real
+    pitch is not picked. Returns None when the page has no regular line structure.
+    """
+    profile = ink.mean(axis=1)
+    profile = profile - profile.mean()
+    corr = np.correlate(profile, profile, "full")[len(profile) - 1:]
+    if corr[0] <= 0:
+        return None
+    corr = corr[min_px:max_px] / corr[0]
+    peaks = [i for i in range(1, len(corr) - 1) if corr[i] > 0 and corr[i - 1] <= corr[i] >= corr[i + 1]]
+    if not peaks:
+        return None
+    strongest = max(corr[i] for i in peaks)
+    return min_px + next(i for i in peaks if corr[i] >= 0.6 * strongest)
+
+
+def choose_dpi(preview, preview_dpi=PREVIEW_DPI):
+    """Render DPI for a page from a low-resolution grayscale preview, or None if the page is blank.
+
+    Small typed text gets MAX_DPI; large handwriting needs fewer pixels to stay legible.
+    """
+    ink = flatten_background(preview.convert("L")) < INK_LEVEL
+    if ink.mean() < BLANK_INK_RATIO:
+        return None
+    pitch = line_pitch(ink)
+    if pitch is None:
+        # Diagrams or sparse text: no evidence that a lower resolution is safe
+        return MAX_DPI
+    return int(min(max(TARGET_LINE_PITCH_PX * preview_dpi / pitch, MIN_DPI), MAX_DPI))
+
+
+def clean_page(page, dpi, bilevel=False):
+    """Grayscale page with a white background, margins trimmed and tall blank bands collapsed.
+
+    Returns None if nothing is left to OCR.
+    """
+    pixels = flatten_background(page.convert("L"))
+    if bilevel:
+        pixels = np.where(pixels < INK_LEVEL, 0, 255).astype(np.uint8)
+    ink = pixels < INK_LEVEL
+    rows = _content_rows(ink)
+    cols = np.flatnonzero(ink.sum(axis=0) > ink.shape[0] * 0.005)
+    if not rows.any() or not len(cols):
+        return None
+    pad = int(PAD_INCHES * dpi)
+    left, right = max(cols[0] - pad, 0), min(cols[-1] + 1 + pad, pixels.shape[1])
+    keep = np.ones(len(rows), dtype=bool)
+    content = np.flatnonzero(rows)
+    keep[:max(content[0] - pad, 0)] = False
+    keep[content[-1] + 1 + pad:] = False
+    max_gap = int(MAX_GAP_INCHES * dpi)
+    for start, end in _runs(~rows):
+        # Interior bands only; the top and bottom margins were trimmed above
+        if start > 0 and end < len(rows) and end - start > max_gap:
+            keep[start + max_gap:end] = False
+    return Image.fromarray(pixels[keep][:, left:right])
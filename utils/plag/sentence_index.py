@@ -0,0 +1,82 @@
+import hashlib
+import re
+
+QUERY_BATCH_SIZE = 500
+
+
+def split_into_sentences(text):
+    # Simple sentence splitter using regex (can be replaced with nltk if needed)
+    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
+    # Remove empty sentences
+    return [s.strip() for s in sentences if s.strip()]
+
+
+def normalize_sentence(sentence):
+    return " ".join(sentence.lower().split())
+
+
+def hash_sentence(sentence):
+    return hashlib.blake2b(sentence.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def sentence_hashes(text, min_length=50):
+    """Returns the sorted, de-duplicated sentence hashes of text (empty if text is too short)."""
+    if not text or len(text) < min_length:
+        return []
+    return sorted({hash_sentence(normalize_sentence(s)) for s in split_into_sentences(text)})
+
+
+class SentenceIndex:
+    """Inverted index of sentence hash -> submission ids, kept in the submissions database."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sentence_sets (
+                submission_id INTEGER PRIMARY KEY,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS sentence_hashes (
+                hash TEXT NOT NULL,
+                submission_id INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_sentence_hashes_hash ON sentence_hashes (hash);
+            CREATE INDEX IF NOT EXISTS idx_sentence_hashes_submission ON sentence_hashes (submission_id);
+        """)
+
+    def add(self, submission_id, hashes):
+        """Must be called inside the caller's write transaction."""
+        self.conn.execute("INSERT INTO sentence_sets VALUES (?, ?)", (submission_id, len(hashes)))
+        self.conn.executemany(
+            "INSERT INTO sentence_hashes VALUES (?, ?)", [(h, submission_id) for h in hashes]
+        )
+
+    def hash_sets(self, submission_ids):
+        """Returns {submission_id: [hashes]} for the given ids."""
+        ids = list(set(submission_ids))
+        docs = {submission_id: [] for submission_id in ids}
+        # Batched, to stay under SQLite's bound-parameter limit
+        for start in range(0, len(ids), QUERY_BATCH_SIZE):
+            batch = ids[start:start + QUERY_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            for h, submission_id in self.conn.execute(
+                f"SELECT hash, submission_id FROM sentence_hashes WHERE submission_id IN ({placeholders})", batch
+            ):
+                docs[submission_id].append(h)
+        return docs
+
+    def similar(self, submission_id):
+        """Returns {other_id: jaccard} for every submission sharing at least one sentence."""
+        rows = self.conn.execute("""
+            SELECT o.submission_id, COUNT(*), os.size, ts.size
+            FROM sentence_hashes t
+            JOIN sentence_hashes o ON o.hash = t.hash AND o.submission_id != t.submission_id
+            JOIN sentence_sets os ON os.submission_id = o.submission_id
+            JOIN sentence_sets ts ON ts.submission_id = t.submission_id
+            WHERE t.submission_id = ?
+            GROUP BY o.submission_id
+        """, (submission_id,))
+        return {
+            other_id: shared / (size + other_size - shared)
+            for other_id, shared, other_size, size in rows
+        }
@@ -0,0 +1,207 @@
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from utils.plag.artifacts import ArtifactStore
+from utils.plag.embeddings import EmbeddingIndex
+from utils.plag.phash import MAX_DISTANCE, PageHashIndex
+from utils.plag.sentence_index import QUERY_BATCH_SIZE, SentenceIndex, sentence_hashes
+from utils.plag.winnow import FingerprintIndex, fingerprint
+
+DB_PATH = "submissions.db"
+LEGACY_DB_PATH = "vision_text_db.json"
+
+
+def utc_now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class SubmissionStore:
+    """SQLite-backed submission store. Every resubmission by a roll number gets a new version;
+    WAL mode lets concurrent faculty sessions read while one of them writes."""
+
+    def __init__(self, path=DB_PATH):
+        # Autocommit mode: write transactions are opened explicitly with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS submissions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                roll_no TEXT NOT NULL,
+                name TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                pdf_path TEXT,
+                stitched_path TEXT,
+                extracted_text TEXT NOT NULL,
+                submitted_at TEXT NOT NULL,
+                UNIQUE (roll_no, version)
+            );
+            CREATE INDEX IF NOT EXISTS idx_submissions_roll_no ON submissions (roll_no);
+            CREATE INDEX IF NOT EXISTS idx_submissions_submitted_at ON submissions (submitted_at);
+            CREATE TABLE IF NOT EXISTS legacy_imports (
+                path TEXT PRIMARY KEY,
+                entries INTEGER NOT NULL,
+                imported_at TEXT NOT NULL
+            );
+        """)
+        self.sentences = SentenceIndex(self.conn)
+        self.fingerprints = FingerprintIndex(self.conn)
+        self.page_hashes = PageHashIndex(self.conn)
+        self.embeddings = EmbeddingIndex(self.conn)
+        self.artifacts = ArtifactStore(self.conn)
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def transaction(self):
+        # IMMEDIATE takes the write lock up front, so concurrent writers queue instead of deadlocking
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def add_submission(self, roll_no, name, pdf_path, stitched_path, extracted_text, submitted_at=None, page_hashes=None,
+                       embeddings=None, page_duplicates=None, skipped_pages=()):
+        """Stores a submission with its sentence hashes, fingerprints, the perceptual hashes
+        of its scanned pages ({page_number: hash}), the pages flagged as copies of other
+        students' pages ({page_number: [match]}, skipped_pages left out of OCR) and, if given,
+        its sentence embeddings (see utils.plag.embeddings). Returns (id, version)."""
+        # Hash outside the transaction so the write lock is held only for the inserts
+        hashes = sentence_hashes(extracted_text)
+        fingerprints = fingerprint(extracted_text)
+        with self.transaction():
+            submission_id, version = self._insert(roll_no, name, pdf_path, stitched_path, extracted_text,
+                                                  submitted_at or utc_now(), hashes, fingerprints)
+            self.page_hashes.add(submission_id, page_hashes or {})
+            self.page_hashes.add_duplicates(submission_id, page_duplicates or {}, skipped_pages)
+            if embeddings is not None:
+                self.embeddings.add(submission_id, embeddings)
+        return submission_id, version
+
+    def add_embeddings(self, submission_id, embeddings):
+        """Stores embeddings for a submission ingested without them."""
+        with self.transaction():
+            self.embeddings.add(submission_id, embeddings)
+
+    def _insert(self, roll_no, name, pdf_path, stitched_path, extracted_text, submitted_at, hashes, fingerprints):
+        version = self.conn.execute(
+            "SELECT COALESCE(MAX(version), 0) + 1 FROM submissions WHERE roll_no = ?", (roll_no,)
+        ).fetchone()[0]
+        submission_id = self.conn.execute(
+            "INSERT INTO submissions (roll_no, name, version, pdf_path, stitched_path, extracted_text, submitted_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (roll_no, name, version, pdf_path, stitched_path, extracted_text, submitted_at)
+        ).lastrowid
+        self.sentences.add(submission_id, hashes)
+        self.fingerprints.add(submission_id, fingerprints)
+        return submission_id, version
+
+    def roll_numbers(self):
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT roll_no FROM submissions ORDER BY roll_no")]
+
+    def versions(self, roll_no):
+        """Submissions of one roll number, newest first (without extracted text)."""
+        return [dict(row) for row in self.conn.execute(
+            "SELECT id, roll_no, name, version, submitted_at FROM submissions WHERE roll_no = ? ORDER BY version DESC",
+            (roll_no,)
+        )]
+
+    def latest(self):
+        """Latest version of every roll number (without extracted text)."""
+        return [dict(row) for row in self.conn.execute("""
+            SELECT id, roll_no, name, version, submitted_at FROM submissions s
+            WHERE version = (SELECT MAX(version) FROM submissions WHERE roll_no = s.roll_no)
+            ORDER BY roll_no
+        """)]
+
+    def get(self, submission_id):
+        row = self.conn.execute("SELECT * FROM submissions WHERE id = ?", (submission_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_many(self, submission_ids):
+        """Returns {id: submission} (without extracted text)."""
+        ids = list(set(submission_ids))
+        entries = {}
+        # Batched, to stay under SQLite's bound-parameter limit
+        for start in range(0, len(ids), QUERY_BATCH_SIZE):
+            batch = ids[start:start + QUERY_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            for row in self.conn.execute(
+                f"SELECT id, roll_no, name, version, submitted_at FROM submissions WHERE id IN ({placeholders})", batch
+            ):
+                entries[row["id"]] = dict(row)
+        return entries
+
+    def duplicate_pages(self, page_hash, roll_no, max_distance=MAX_DISTANCE):
+        """Pages of other roll numbers' submissions that look like the same scan as page_hash,
+        closest first: [{"submission_id", "roll_no", "name", "version", "page", "distance"}]."""
+        matches = self.page_hashes.near(page_hash, max_distance)
+        entries = self.get_many({submission_id for submission_id, _, _ in matches})
+        return [
+            {**{key: entries[submission_id][key] for key in ("roll_no", "name", "version")},
+             "submission_id": submission_id, "page": page, "distance": distance}
+            for submission_id, page, distance in matches
+            if entries[submission_id]["roll_no"] != roll_no
+        ]
+
+    def flagged_pages(self, submission_id):
+        """Pages of a submission flagged at ingest as copies of other students' pages:
+        [{"page", "roll_no", "name", "version", "their_page", "distance", "skipped"}]."""
+        return [dict(row) for row in self.conn.execute("""
+            SELECT d.page, s.roll_no, s.name, s.version, d.other_page AS their_page, d.distance, d.skipped
+            FROM page_duplicates d JOIN submissions s ON s.id = d.other_submission_id
+            WHERE d.submission_id = ?
+            ORDER BY d.page, d.distance
+        """, (submission_id,))]
+
+    def is_empty(self):
+        return self.conn.execute("SELECT 1 FROM submissions LIMIT 1").fetchone() is None
+
+    def import_json(self, json_path=LEGACY_DB_PATH):
+        """One-time import of a legacy vision_text_db.json. The import is recorded in
+        legacy_imports and the file is renamed to <name>.imported afterwards, so it is never
+        imported twice. Returns the number of entries imported (0 if already imported)."""
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            # Legacy entries have no timestamps; the file's last write is the best estimate
+            submitted_at = datetime.fromtimestamp(os.path.getmtime(json_path), timezone.utc).isoformat()
+        except FileNotFoundError:
+            return 0  # not there, or another session has just imported and renamed it
+        rows = [
+            (entry["roll_no"], entry["name"], entry.get("pdf_path"), entry.get("stitched_path"),
+             entry.get("extracted_text") or "")
+            for entry in entries
+        ]
+        prepared = [(row, sentence_hashes(row[4]), fingerprint(row[4])) for row in rows]
+        key = os.path.abspath(json_path)
+        # A single transaction, so an interrupted import leaves nothing behind and can be rerun.
+        # The marker is checked under the write lock: of two sessions importing at once, one imports.
+        with self.transaction():
+            imported = self.conn.execute("SELECT 1 FROM legacy_imports WHERE path = ?", (key,)).fetchone()
+            if not imported:
+                for row, hashes, fingerprints in prepared:
+                    self._insert(*row, submitted_at, hashes, fingerprints)
+                self.conn.execute("INSERT INTO legacy_imports VALUES (?, ?, ?)", (key, len(entries), utc_now()))
+        try:
+            os.replace(json_path, f"{json_path}.imported")
+        except FileNotFoundError:
+            pass  # renamed by the other session
+        return 0 if imported else len(entries)
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2:
+        print("Usage: python -m utils.plag.store <vision_text_db.json> [submissions.db]")
+        sys.exit(1)
+    store = SubmissionStore(sys.argv[2] if len(sys.argv) > 2 else DB_PATH)
+    count = store.import_json(sys.argv[1])
+    print(f"Imported {count} submissions.")
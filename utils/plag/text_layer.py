@@ -0,0 +1,51 @@
+import unicodedata
+import pymupdf
+
+MIN_PAGE_CHARS = 100  # below this, a page that is mostly a picture is OCR'd anyway
+MIN_ALNUM_RATIO = 0.75  # share of non-space characters that are letters or digits
+MIN_WORD_RATIO = 0.6  # share of tokens that are mostly letters or digits
+MAX_IMAGE_COVERAGE = 0.5
+
+
+def _visible(text):
+    # Drop zero-width and other format characters that typed PDFs sprinkle around bullets
+    return "".join(c for c in text if unicodedata.category(c) != "Cf")
+
+
+def looks_like_text(text):
+    """True if text reads like real embedded text rather than a scanner's garbled OCR layer."""
+    tokens = _visible(text).split()
+    chars = "".join(tokens)
+    if not chars:
+        return False
+    alnum = sum(c.isalnum() for c in chars) / len(chars)
+    words = sum(1 for t in tokens if sum(c.isalnum() for c in t) >= len(t) * 0.6) / len(tokens)
+    return alnum >= MIN_ALNUM_RATIO and words >= MIN_WORD_RATIO
+
+
+def _image_coverage(page):
+    area = page.rect.width * page.rect.height
+    covered = sum(pymupdf.Rect(info["bbox"]).intersect(page.rect).get_area() for info in page.get_image_info())
+    return min(covered / area, 1.0) if area else 0.0
+
+
+def page_text(page):
+    """Embedded text of a page, or None if the page has to be OCR'd."""
+    text = page.get_text()
+    coverage = _image_coverage(page)
+    if not _visible(text).strip():
+        # Nothing embedded: blank pages need no OCR, scanned ones do
+        return "" if coverage == 0 else None
+    if not looks_like_text(text):
+        return None
+    if len(_visible(text).strip()) < MIN_PAGE_CHARS and coverage > MAX_IMAGE_COVERAGE:
+        # A caption on a photographed page; the picture is where the content is
+        return None
+    return text
+
+
+def extract_text_layer(pdf_path):
+    """Embedded text of every page, or None for pages that need OCR (scanned, handwritten,
+    or carrying an unusable OCR layer)."""
+    with pymupdf.open(pdf_path) as doc:
+        return [page_text(page) for page in doc]
@@ -1,37 +1,146 @@
-
 from groq import Groq
 import base64
+import mimetypes
 import os
+import re
 from dotenv import load_dotenv
+from utils.plag.ocr_cache import cache_key, get_ocr_cache
 
-def extract_text_from_image(image_path):
+VISION_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+OCR_PROMPT = "Do not answer any questions other than to Extract the text as it is looking in the image. Remember if the text is handwritten, you should not try to correct it or change it. Just extract the text as it is."
+# Per-request limits of the vision model: images per message and total encoded payload
+MAX_IMAGES_PER_REQUEST = 5
+MAX_REQUEST_BYTES = 19 * 1024 * 1024
+IMAGE_MARKER = "=== IMAGE {} ==="
+
+
+class BatchMismatchError(ValueError):
+    """A batched OCR answer whose image markers could not be mapped back to the images."""
+
+
+def _client():
     load_dotenv()
     api_key = os.getenv("GROQ_PLAG_API")
     if not api_key:
         raise ValueError("GROQ_PLAG_API not set in .env file")
-    client = Groq(api_key=api_key)
+    return Groq(api_key=api_key)
+
+
+def _image_content(image_path):
+    mime = mimetypes.guess_type(image_path)[0] or "image/jpeg"
     with open(image_path, "rb") as image_file:
         base64_image = base64.b64encode(image_file.read()).decode('utf-8')
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": f"data:{mime};base64,{base64_image}",
+        },
+    }
+
+
+def _ocr_request(image_path):
+    client = _client()
     chat_completion = client.chat.completions.create(
         messages=[
             {
                 "role": "user",
                 "content": [
-                    {"type": "text", "text": "Do not answer any questions other than to Extract the text as it is looking in the image. Remember if the text is handwritten, you should not try to correct it or change it. Just extract the text as it is."},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}",
-                        },
-                    },
+                    {"type": "text", "text": OCR_PROMPT},
+                    _image_content(image_path),
                 ],
             }
         ],
-        model="meta-llama/llama-4-scout-17b-16e-instruct",
+        model=VISION_MODEL,
     )
     return chat_completion.choices[0].message.content
 
+
+def extract_text_from_image(image_path):
+    return extract_text_from_images([image_path])[0]
+
+
+def batch_images(image_paths, max_images=MAX_IMAGES_PER_REQUEST, max_bytes=MAX_REQUEST_BYTES):
+    """Groups image paths, in order, into batches that fit one vision request.
+
+    Works lazily on any iterable, so batches can be dispatched while later images are still being produced.
+    """
+    batch, batch_bytes = [], 0
+    for path in image_paths:
+        # base64 inflates the payload by 4/3
+        size = os.path.getsize(path) * 4 // 3
+        if batch and (len(batch) == max_images or batch_bytes + size > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(path)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def split_batch_response(text, count):
+    """Splits a batched OCR response on its image markers. Returns None if the markers don't line up."""
+    parts = re.split(r"^\s*=== IMAGE (\d+) ===\s*$", text, flags=re.MULTILINE)
+    numbers = [int(n) for n in parts[1::2]]
+    if numbers != list(range(1, count + 1)):
+        return None
+    return [part.strip("\n") for part in parts[2::2]]
+
+
+def _batch_ocr_request(image_paths, split_on_mismatch):
+    if len(image_paths) == 1:
+        return [_ocr_request(image_paths[0])]
+    client = _client()
+    content = [{
+        "type": "text",
+        "text": (
+            f"{OCR_PROMPT}\n\nYou are given {len(image_paths)} images. For each image, in order, write a line "
+            f"'{IMAGE_MARKER.format('N')}' (N is the image number starting at 1) followed by that image's text."
+        ),
+    }]
+    for i, path in enumerate(image_paths, start=1):
+        content.append({"type": "text", "text": IMAGE_MARKER.format(i)})
+        content.append(_image_content(path))
+    chat_completion = client.chat.completions.create(
+        messages=[{"role": "user", "content": content}],
+        model=VISION_MODEL,
+    )
+    texts = split_batch_response(chat_completion.choices[0].message.content, len(image_paths))
+    if texts is None:
+        if not split_on_mismatch:
+            raise BatchMismatchError(f"OCR answer for {len(image_paths)} images has mismatched markers")
+        return [_ocr_request(path) for path in image_paths]
+    return texts
+
+
+def cached_texts(image_paths):
+    """Cached OCR texts of image_paths, in order; None for images not OCR'd before."""
+    ocr_cache = get_ocr_cache()
+    return [ocr_cache.get(cache_key(path, VISION_MODEL, OCR_PROMPT)) for path in image_paths]
+
+
+def extract_text_from_images(image_paths, split_on_mismatch=True, check_cache=True):
+    """OCRs several images in a single request and returns their texts in order.
+
+    Results are cached by image content, so only images never seen before are sent to
+    the model. Callers should group paths with batch_images first. If the model's answer
+    cannot be mapped back to the images, each image is OCR'd on its own instead, or, with
+    split_on_mismatch=False, BatchMismatchError is raised so a rate-limited caller can send
+    those requests itself (see ocr_pool). check_cache=False is for callers that looked the
+    images up with cached_texts already; results are cached either way.
+    """
+    keys = [cache_key(path, VISION_MODEL, OCR_PROMPT) for path in image_paths]
+    ocr_cache = get_ocr_cache()
+    texts = [ocr_cache.get(key) for key in keys] if check_cache else [None] * len(keys)
+    missing = [i for i, text in enumerate(texts) if text is None]
+    if missing:
+        fresh = _batch_ocr_request([image_paths[i] for i in missing], split_on_mismatch)
+        for i, text in zip(missing, fresh):
+            texts[i] = text
+            ocr_cache.put(keys[i], text)
+    return texts
+
+
 if __name__ == "__main__":
     # For standalone testing only
     image_path = "full-page.png"
-    print(extract_text_from_image(image_path))
\ No newline at end of file
+    print(extract_text_from_image(image_path))
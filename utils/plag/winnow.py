@@ -0,0 +1,107 @@
+import hashlib
+from collections import defaultdict
+
+K = 25  # k-gram length in normalized characters
+WINDOW = 10  # any shared run of K + WINDOW - 1 characters is guaranteed to be detected
+
+
+def normalize_with_offsets(text):
+    """Lowercases text and drops everything but letters and digits, so OCR spacing,
+    punctuation and line breaks don't matter. Returns the normalized string and the
+    original offset of every normalized character."""
+    chars, offsets = [], []
+    for i, c in enumerate(text):
+        if c.isalnum():
+            chars.append(c.lower())
+            offsets.append(i)
+    return "".join(chars), offsets
+
+
+def _kgram_hash(kgram):
+    # Signed so the hash fits an SQLite INTEGER column
+    return int.from_bytes(hashlib.blake2b(kgram.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+def fingerprint(text, k=K, window=WINDOW):
+    """MOSS-style winnowing. Returns [hash, start, end] triples with character spans in the original text."""
+    if not text:
+        return []
+    norm, offsets = normalize_with_offsets(text)
+    hashes = [_kgram_hash(norm[i:i + k]) for i in range(len(norm) - k + 1)]
+    if not hashes:
+        return []
+    selected = []
+    last = -1
+    for start in range(max(len(hashes) - window + 1, 1)):
+        # Rightmost minimum in the window, so runs of equal hashes are recorded once
+        best = start
+        for i in range(start, min(start + window, len(hashes))):
+            if hashes[i] <= hashes[best]:
+                best = i
+        if best != last:
+            selected.append([hashes[best], offsets[best], offsets[best + k - 1] + 1])
+            last = best
+    return selected
+
+
+def merge_spans(spans, gap=K):
+    """Merges overlapping spans and spans separated by at most gap characters."""
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1] + gap:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class FingerprintIndex:
+    """Winnowing fingerprints per submission, kept in the submissions database and indexed by hash."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                hash INTEGER NOT NULL,
+                submission_id INTEGER NOT NULL,
+                start INTEGER NOT NULL,
+                "end" INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_fingerprints_hash ON fingerprints (hash);
+            CREATE INDEX IF NOT EXISTS idx_fingerprints_submission ON fingerprints (submission_id);
+        """)
+
+    def add(self, submission_id, fingerprints):
+        """Must be called inside the caller's write transaction."""
+        self.conn.executemany(
+            "INSERT INTO fingerprints VALUES (?, ?, ?, ?)",
+            [(h, submission_id, start, end) for h, start, end in fingerprints]
+        )
+
+    def matches(self, submission_id):
+        """Returns {other_id: {"score", "spans", "other_spans"}} for every submission sharing a
+        fingerprint. score is the share of this submission's fingerprints found in the other one;
+        spans/other_spans are the merged matched character ranges in each text."""
+        own = defaultdict(list)
+        for h, start, end in self.conn.execute(
+            'SELECT hash, start, "end" FROM fingerprints WHERE submission_id = ?', (submission_id,)
+        ):
+            own[h].append((start, end))
+        if not own:
+            return {}
+        shared = defaultdict(set)
+        other_spans = defaultdict(list)
+        for other_id, h, start, end in self.conn.execute("""
+            SELECT submission_id, hash, start, "end" FROM fingerprints
+            WHERE hash IN (SELECT hash FROM fingerprints WHERE submission_id = ?) AND submission_id != ?
+        """, (submission_id, submission_id)):
+            shared[other_id].add(h)
+            other_spans[other_id].append((start, end))
+        return {
+            other_id: {
+                "score": len(hashes) / len(own),
+                "spans": merge_spans([span for h in hashes for span in own[h]]),
+                "other_spans": merge_spans(other_spans[other_id]),
+            }
+            for other_id, hashes in shared.items()
+        }
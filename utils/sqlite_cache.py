@@ -0,0 +1,126 @@
+"""SQLite key/value cache with least-recently-used eviction and named hit/miss counters.
+
+The OCR, document extraction and AI Buddy answer caches subclass SQLiteCache and only
+declare their table and value columns. Each call opens its own connection, so one instance
+can be shared by every worker thread and Streamlit session of the process.
+"""
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class SQLiteCache:
+    """One table keyed by key, evicted least recently used first.
+
+    Subclasses set table, columns (the value column definitions), stats_table and counters.
+    A cache with max_bytes keeps a size column and stays under that many bytes; otherwise it
+    keeps at most max_entries rows.
+    """
+
+    table = None
+    columns = ""
+    indexes = ()  # extra CREATE INDEX statements
+    stats_table = None
+    counters = ("hits", "misses")
+
+    def __init__(self, path, max_bytes=None, max_entries=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        size = "size INTEGER NOT NULL," if max_bytes is not None else ""
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    {self.columns},
+                    {size}
+                    last_access REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_{self.table}_last_access ON {self.table} (last_access);
+                CREATE TABLE IF NOT EXISTS {self.stats_table} (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+            """)
+            for index in self.indexes:
+                conn.execute(index)
+            conn.executemany(
+                f"INSERT OR IGNORE INTO {self.stats_table} VALUES (?, 0)", [(name,) for name in self.counters]
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _count(self, conn, counter):
+        conn.execute(f"UPDATE {self.stats_table} SET value = value + 1 WHERE name = ?", (counter,))
+
+    def _touch(self, conn, key):
+        conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (time.time(), key))
+
+    def _lookup(self, key, columns):
+        """The row of columns stored under key, or None, counted as a hit or a miss."""
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {columns} FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._touch(conn, key)
+            self._count(conn, "hits" if row else "misses")
+        return row
+
+    def _store(self, key, size=None, **values):
+        """Store values under key (size in bytes for a byte-budgeted cache), then evict."""
+        values = {"key": key, **values, "last_access": time.time()}
+        if self.max_bytes is not None:
+            values["size"] = size
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})",
+                tuple(values.values())
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        if self.max_bytes is None:
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            return
+        total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        for old_key, old_size in conn.execute(
+            f"SELECT key, size FROM {self.table} ORDER BY last_access"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (old_key,))
+            total -= old_size
+
+    def stats(self):
+        with self._connect() as conn:
+            stats = dict(conn.execute(f"SELECT name, value FROM {self.stats_table}"))
+            stats["entries"] = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            if self.max_bytes is not None:
+                stats["bytes"] = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        return stats
+
+
+def shared(factory):
+    """A getter for one process-wide factory() instance, created (with its database file) on first use."""
+    instance = None
+    lock = threading.Lock()
+
+    def get():
+        nonlocal instance
+        with lock:
+            if instance is None:
+                instance = factory()
+        return instance
+    return get
@@ -0,0 +1,97 @@
+"""Streaming LLM completions with time-to-first-token tracking.
+
+Every stream passed through timed_stream is appended to LLM_LATENCY_LOG (JSON lines) with
+its time to first token and total time. Summarise the log with: python -m utils.streaming
+"""
+import json
+import os
+import statistics
+import threading
+import time
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+load_dotenv()
+LLM_LATENCY_LOG = os.getenv("LLM_LATENCY_LOG", "llm_latency.jsonl")
+_log_lock = threading.Lock()
+
+
+def groq_deltas(stream, stats=None):
+    """Text deltas of a Groq chat completion stream; the prompt token count, sent with the
+    last chunk, goes into stats["prompt_tokens"]."""
+    for chunk in stream:
+        usage = chunk.x_groq.usage if chunk.x_groq else None
+        if usage and stats is not None:
+            stats["prompt_tokens"] = usage.prompt_tokens
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def agent_deltas(responses):
+    """Text deltas of an Agno agent.run(..., stream=True) response iterator."""
+    for response in responses:
+        content = getattr(response, "content", None)
+        if isinstance(content, str) and content:
+            yield content
+
+
+def timed_stream(deltas, name, stats=None, model=None):
+    """Passes text deltas through, timing them. When the stream ends (or is abandoned),
+    stats gets ttft_s, total_s and chars, and the record is appended to the latency log."""
+    stats = {} if stats is None else stats
+    start = time.perf_counter()
+    chars = 0
+    try:
+        for delta in deltas:
+            if "ttft_s" not in stats:
+                stats["ttft_s"] = time.perf_counter() - start
+            chars += len(delta)
+            yield delta
+        stats["completed"] = True
+    finally:
+        stats.update(total_s=time.perf_counter() - start, chars=chars)
+        stats.setdefault("completed", False)
+        record_latency(name, stats, model)
+
+
+def record_latency(name, stats, model=None):
+    record = {"at": datetime.now(timezone.utc).isoformat(), "name": name, "model": model, **stats}
+    try:
+        with _log_lock, open(LLM_LATENCY_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError:
+        pass  # latency tracking must never break a completion
+
+
+def _p95(values):
+    return sorted(values)[min(int(len(values) * 0.95), len(values) - 1)]
+
+
+def summarize(path=LLM_LATENCY_LOG):
+    """{name: {"calls", "ttft_p50", "ttft_p95", "total_p50", "total_p95"}} over the latency log."""
+    by_name = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            by_name.setdefault(record["name"], []).append(record)
+    summary = {}
+    for name, records in sorted(by_name.items()):
+        ttfts = [r["ttft_s"] for r in records if "ttft_s" in r]
+        totals = [r["total_s"] for r in records]
+        summary[name] = {
+            "calls": len(records),
+            "ttft_p50": statistics.median(ttfts) if ttfts else None,
+            "ttft_p95": _p95(ttfts) if ttfts else None,
+            "total_p50": statistics.median(totals),
+            "total_p95": _p95(totals),
+        }
+    return summary
+
+
+if __name__ == "__main__":
+    import sys
+    path = sys.argv[1] if len(sys.argv) > 1 else LLM_LATENCY_LOG
+    print(f"{'call':<16}{'calls':>7}{'TTFT p50':>10}{'TTFT p95':>10}{'total p50':>11}{'total p95':>11}")
+    for name, row in summarize(path).items():
+        ttft = (f"{row['ttft_p50']:>9.2f}s{row['ttft_p95']:>9.2f}s" if row["ttft_p50"] is not None else f"{'-':>10}{'-':>10}")
+        print(f"{name:<16}{row['calls']:>7}{ttft}{row['total_p50']:>10.2f}s{row['total_p95']:>10.2f}s")
@@ -1,43 +1,268 @@
 import streamlit as st
 import os
-from utils.plag.pdf_to_image import pdf_to_stitched_image
-from utils.plag.vision import extract_text_from_image
+from utils.plag.jobs import JobQueue, ensure_workers
+from utils.plag.ocr_cache import get_ocr_cache
+from utils.plag.minhash import scan_cohort
+from utils.plag.embeddings import embed_text, semantic_available, semantic_scores
+from utils.plag.store import DB_PATH, SubmissionStore, LEGACY_DB_PATH
+from utils.plag.artifacts import STITCHED_DIR
+import html
 import json
-import re
+import pandas as pd
 
-UPLOAD_DIR = "uploads"
-STITCHED_DIR = "stitched"
-DB_PATH = "vision_text_db.json"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+JOB_POLL_SECONDS = 2
 os.makedirs(STITCHED_DIR, exist_ok=True)
 
-def save_to_db(roll_no, name, pdf_path, stitched_path, extracted_text):
-    if os.path.exists(DB_PATH):
-        with open(DB_PATH, "r", encoding="utf-8") as f:
-            db = json.load(f)
+def tracked_jobs():
+    # Kept in the URL, so a browser refresh still shows the submissions in progress
+    return [int(job_id) for job_id in st.query_params.get_all("job")]
+
+def track_job(job_id):
+    if job_id not in tracked_jobs():
+        st.query_params.add("job", str(job_id))
+
+def untrack_job(job_id):
+    st.query_params["job"] = [str(other) for other in tracked_jobs() if other != job_id]
+
+def show_flagged_pages(duplicates):
+    """Scanned pages flagged as copies of other students' pages (see SubmissionStore.flagged_pages)."""
+    if not duplicates:
+        return
+    skipped = {d["page"] for d in duplicates if d.get("skipped")}
+    st.warning(f"{len({d['page'] for d in duplicates})} scanned pages look like copies of other students' pages"
+               + (f"; {len(skipped)} near-identical ones were not OCR'd, so their text is not in the submission."
+                  if skipped else "."))
+    st.dataframe(pd.DataFrame([
+        {
+            "Page": duplicate["page"],
+            "Roll No": duplicate["roll_no"],
+            "Name": duplicate["name"],
+            "Version": duplicate["version"],
+            "Their Page": duplicate["their_page"],
+            "Bits Different": duplicate["distance"],
+            "OCR Skipped": bool(duplicate.get("skipped"))
+        }
+        for duplicate in duplicates
+    ]), hide_index=True)
+
+def show_job(job, store):
+    st.markdown(f"**Job #{job['id']}** — Roll No: {job['roll_no']} | Name: {job['name']}")
+    if job["status"] == "queued":
+        st.info("Waiting for a worker...")
+    elif job["status"] == "running":
+        total = job["pages_total"]
+        if job["stage"] == "indexing":
+            st.progress(1.0, text="Text extracted; indexing for plagiarism checks...")
+        elif total:
+            st.progress(job["pages_ocr_done"] / total,
+                        text=f"{job['pages_rasterized']}/{total} pages rasterized, {job['pages_ocr_done']}/{total} OCR'd")
+        else:
+            st.progress(0.0, text="Reading the PDF's text layer...")
+    elif job["status"] == "failed":
+        st.error(f"Processing failed: {job['error']}")
     else:
-        db = []
-    db.append({
-        "roll_no": roll_no,
-        "name": name,
-        "pdf_path": pdf_path,
-        "stitched_path": stitched_path,
-        "extracted_text": extracted_text
-    })
-    with open(DB_PATH, "w", encoding="utf-8") as f:
-        json.dump(db, f, indent=2, ensure_ascii=False)
-
-def load_db():
-    if not os.path.exists(DB_PATH):
-        return []
-    with open(DB_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def split_into_sentences(text):
-    # Simple sentence splitter using regex (can be replaced with nltk if needed)
-    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
-    # Remove empty sentences
-    return [s.strip() for s in sentences if s.strip()]
+        result = json.loads(job["result"])
+        st.success(f"Text extracted and saved for plagiarism checking (version {result['version']}).")
+        st.caption(f"{result['pages']} pages: {result['text_layer_pages']} from the text layer, {result['ocr_pages']} OCR'd")
+        show_flagged_pages(result["duplicates"])
+        with st.expander("Extracted Text"):
+            st.text_area("Extracted Text", store.get(job["submission_id"])["extracted_text"], height=300,
+                         key=f"job_text_{job['id']}")
+    if job["status"] in ("done", "failed") and st.button("Dismiss", key=f"dismiss_job_{job['id']}"):
+        untrack_job(job["id"])
+        st.rerun()
+
+def load_jobs(job_ids):
+    queue = JobQueue(DB_PATH)
+    try:
+        return [job for job in (queue.get(job_id) for job_id in reversed(job_ids)) if job]
+    finally:
+        queue.close()
+
+def unfinished(jobs):
+    return any(job["status"] in ("queued", "running") for job in jobs)
+
+def show_jobs():
+    # Polled only while a tracked job is unfinished; finished jobs are shown once, without a timer
+    jobs = load_jobs(tracked_jobs())
+    if jobs:
+        st.fragment(run_every=JOB_POLL_SECONDS if unfinished(jobs) else None)(poll_jobs)()
+
+def poll_jobs():
+    jobs = load_jobs(tracked_jobs())
+    if unfinished(jobs):
+        # After a server restart, or if every worker died, the queued jobs would otherwise wait for the next submission
+        ensure_workers()
+    store = SubmissionStore(DB_PATH)
+    try:
+        for job in jobs:
+            with st.container(border=True):
+                show_job(job, store)
+    finally:
+        store.close()
+    if not unfinished(jobs) and st.session_state.pop("jobs_polling", False):
+        # The last job just finished: a full rerun redraws the list without the polling timer
+        st.rerun()
+    st.session_state["jobs_polling"] = unfinished(jobs)
+    cache_stats = get_ocr_cache().stats()
+    st.caption(f"OCR cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} cached results")
+
+def open_store():
+    store = SubmissionStore(DB_PATH)
+    # One-time migration of the old JSON database
+    if os.path.exists(LEGACY_DB_PATH):
+        count = store.import_json(LEGACY_DB_PATH)
+        if count:
+            st.toast(f"Imported {count} submissions from {LEGACY_DB_PATH}")
+    return store
+
+def highlight(text, spans):
+    # Rendered as HTML, not markdown, so "#", "*" or "1." in OCR text stay literal
+    parts = []
+    pos = 0
+    for start, end in spans:
+        parts.append(html.escape(text[pos:start]))
+        parts.append(f"<mark>{html.escape(text[start:end])}</mark>")
+        pos = end
+    parts.append(html.escape(text[pos:]))
+    return f'<div style="white-space: pre-wrap">{"".join(parts)}</div>'
+
+def show_matched_passages(store, target_entry, threshold):
+    results = store.fingerprints.matches(target_entry["id"])
+    entries_by_id = store.get_many(results)
+    matches = [
+        (entries_by_id[other_id], result)
+        for other_id, result in results.items()
+        if entries_by_id[other_id]["roll_no"] != target_entry["roll_no"]
+        and int(result["score"] * 100) >= threshold
+    ]
+    if not matches:
+        return
+    matches.sort(key=lambda m: m[1]["score"], reverse=True)
+    st.subheader("Matched Passages (Fingerprint Level)")
+    for entry, result in matches[:5]:
+        other_text = store.get(entry["id"])["extracted_text"]
+        with st.expander(f"Roll No: {entry['roll_no']} (v{entry['version']}) | Name: {entry['name']} | Overlap: {int(result['score'] * 100)}%"):
+            col1, col2 = st.columns(2)
+            with col1:
+                st.caption(f"{target_entry['roll_no']} — {len(result['spans'])} matched passages")
+                with st.container(height=400):
+                    st.html(highlight(target_entry["extracted_text"], result["spans"]))
+            with col2:
+                st.caption(f"{entry['roll_no']} — {len(result['other_spans'])} matched passages")
+                with st.container(height=400):
+                    st.html(highlight(other_text, result["other_spans"]))
+
+def cohort_semantic_scores(store, target_entry):
+    """{submission_id: semantic score} of the target against the latest submission of every other roll number."""
+    cohort = [entry["id"] for entry in store.latest() if entry["roll_no"] != target_entry["roll_no"]]
+    vectors = store.embeddings.vectors(cohort + [target_entry["id"]])
+    # Submissions from before semantic scoring (or imported ones, or embedded with another model variant)
+    # are embedded on first use
+    for submission_id in set(cohort + [target_entry["id"]]) - set(vectors):
+        vectors[submission_id] = embed_text(store.get(submission_id)["extracted_text"])
+        store.add_embeddings(submission_id, vectors[submission_id])
+    target = vectors.pop(target_entry["id"])
+    return semantic_scores(target, vectors)
+
+def show_cohort_scan(store):
+    threshold = st.slider("Show pairs above score", 0, 100, 60, 1, key="vision_faculty_cohort_threshold")
+    top_k = st.number_input("Number of pairs to show", min_value=1, max_value=500, value=20, step=1)
+    if st.button(":material/groups: Scan Cohort"):
+        # Screen each roll number's latest submission against the rest of the class
+        entries_by_id = {entry["id"]: entry for entry in store.latest()}
+        docs = store.sentences.hash_sets(entries_by_id)
+        with st.spinner("Comparing all submissions..."):
+            pairs = scan_cohort(docs, threshold / 100, top_k=int(top_k))
+        if not pairs:
+            st.warning("No pairs above the threshold. Try lowering the threshold if you expect a match.")
+            return
+        rows = []
+        for a, b, jaccard_sim in pairs:
+            rows.append({
+                "Roll No A": entries_by_id[a]["roll_no"],
+                "Name A": entries_by_id[a]["name"],
+                "Roll No B": entries_by_id[b]["roll_no"],
+                "Name B": entries_by_id[b]["name"],
+                "Score (%)": int(jaccard_sim * 100)
+            })
+        st.subheader("Most Similar Pairs (Sentence Level)")
+        st.dataframe(pd.DataFrame(rows), hide_index=True)
+
+def check_plagiarism(store):
+    if store.is_empty():
+        st.info("No submissions in the database.")
+        return
+    mode = st.radio("Check mode", ["Single Student", "Scan Cohort"], horizontal=True)
+    if mode == "Scan Cohort":
+        show_cohort_scan(store)
+        return
+    roll_nos = store.roll_numbers()
+    selected_roll = st.selectbox("Select Student Roll Number", roll_nos, index=None)
+    versions = store.versions(selected_roll) if selected_roll else []
+    selected_version = None
+    if len(versions) > 1:
+        selected_version = st.selectbox(
+            "Submission Version", versions,
+            format_func=lambda v: f"v{v['version']} — submitted {v['submitted_at'][:16].replace('T', ' ')} UTC"
+        )
+    elif versions:
+        selected_version = versions[0]
+    threshold = st.slider("Show matches above score", 0, 100, 60, 1, key="vision_faculty_threshold_sentence")
+    if st.button(":material/document_scanner: Check Plagiarism"):
+        target_entry = store.get(selected_version["id"]) if selected_version else None
+        if not target_entry:
+            st.error("Submission not found.")
+            return
+        # Copied page scans are evidence even when they were left out of OCR, and so of the text
+        show_flagged_pages(store.flagged_pages(target_entry["id"]))
+        text = target_entry["extracted_text"]
+        if not text or len(text) < 50:
+            st.warning("Could not extract sufficient text from the selected submission.")
+            return
+        similar = store.sentences.similar(target_entry["id"])
+        semantic = {}
+        if semantic_available():
+            with st.spinner("Comparing meaning with the cohort..."):
+                semantic = cohort_semantic_scores(store, target_entry)
+        entries_by_id = store.get_many(set(similar) | set(semantic))
+        matches = []
+        for other_id, entry in entries_by_id.items():
+            if entry["roll_no"] == selected_roll:
+                continue
+            score = int(similar.get(other_id, 0) * 100)
+            semantic_score = int(semantic[other_id] * 100) if other_id in semantic else None
+            if max(score, semantic_score or 0) >= threshold:
+                matches.append({
+                    "roll_no": entry["roll_no"],
+                    "name": entry["name"],
+                    "score": score,
+                    "semantic_score": semantic_score
+                })
+        sentence_matches = [match for match in matches if match["score"] >= threshold]
+        if not matches:
+            st.warning("No significant plagiarism detected above the threshold. Try lowering the threshold if you expect a match.")
+        else:
+            if sentence_matches:
+                best_match = max(sentence_matches, key=lambda x: x["score"])
+                st.subheader("Most Similar Submission (Sentence Level)")
+                st.write(f"Roll No: {best_match['roll_no']} | Name: {best_match['name']} | Score: {best_match['score']}%")
+                st.info(f"Showing only the most similar match with score ≥ {threshold}")
+            if semantic:
+                # Reworded copies keep their meaning, so they score high here even with a low Jaccard score
+                st.subheader("Similar Submissions (Meaning Level)")
+                st.dataframe(pd.DataFrame([
+                    {
+                        "Roll No": match["roll_no"],
+                        "Name": match["name"],
+                        "Jaccard (%)": match["score"],
+                        "Semantic (%)": match["semantic_score"]
+                    }
+                    for match in sorted(matches, key=lambda m: m["semantic_score"] or 0, reverse=True)
+                ]), hide_index=True)
+            elif not semantic_available():
+                st.caption("Semantic scores need the MiniLM model: run convert_miniLM_openvino.py.")
+        show_matched_passages(store, target_entry, threshold)
 
 def main():
     tab1, tab2 = st.tabs(["Assignment Submission", "Plagiarism Check"])
@@ -45,77 +270,46 @@ def main():
     with tab1:
         st.title(":material/assignment_add: Assignment Submission")
         uploaded_file = st.file_uploader("Upload Assignment PDF (Handwritten/Typed)", type=["pdf"])
-        extracted_text = ""
 
         if uploaded_file is not None:
             with st.container(border=True):
                 roll_no = st.text_input("Roll Number")
                 name = st.text_input("Student Name")
+                skip_duplicates = st.checkbox(
+                    "Skip OCR for pages that are copies of another student's scan",
+                    help="Near-copies of other scans are always flagged; near-identical ones are also not OCR'd, "
+                         "which saves their OCR cost but leaves their text out of the submission."
+                )
                 if st.button("Submit Assignment"):
                     if not (roll_no and name):
                         st.error("Roll number and name required.")
                         return
 
-                    pdf_path = os.path.join(UPLOAD_DIR, f"{roll_no}_{uploaded_file.name}")
-                    with open(pdf_path, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
-                    stitched_path = os.path.join(STITCHED_DIR, f"{roll_no}_stitched.png")
-                    pdf_to_stitched_image(pdf_path, stitched_path)
+                    # Stored by content hash, so re-uploading the same file takes no extra space
+                    store = SubmissionStore(DB_PATH)
+                    try:
+                        pdf_path = store.artifacts.put(uploaded_file.getvalue(), suffix=".pdf")
+                    finally:
+                        store.close()
+                    # Extraction runs in background worker processes; this session only polls the job
+                    queue = JobQueue(DB_PATH)
+                    try:
+                        job_id = queue.enqueue(roll_no, name, pdf_path, skip_duplicates)
+                    finally:
+                        queue.close()
+                    ensure_workers()
+                    track_job(job_id)
+                    st.toast(f"Submission queued as job #{job_id}")
 
-                    st.toast(f"PDF stitched and saved as {stitched_path}")
-
-                    from utils.plag.image_split import split_image_by_size
-                    chunk_paths = split_image_by_size(stitched_path)
-                    extracted_text = ""
-                    for chunk_path in chunk_paths:
-                        extracted_text += extract_text_from_image(chunk_path) + "\n"
-
-                    with st.expander("Extracted Text"):
-                        st.text_area("Extracted Text", extracted_text, height=300)
-                    save_to_db(roll_no, name, pdf_path, stitched_path, extracted_text)
-                    st.success("Text extracted and saved for plagiarism checking.")
+        show_jobs()
 
     with tab2:
         st.title(":material/plagiarism: Plagiarism Check")
-        db = load_db()
-        if not db:
-            st.info("No submissions in the database.")
-            return
-        roll_nos = sorted(set([entry["roll_no"] for entry in db]))
-        selected_roll = st.selectbox("Select Student Roll Number", roll_nos, index=None)
-        threshold = st.slider("Show matches above score", 0, 100, 60, 1, key="vision_faculty_threshold_sentence")
-        if st.button(":material/document_scanner: Check Plagiarism"):
-            target_entry = next((entry for entry in db if entry["roll_no"] == selected_roll), None)
-            if not target_entry:
-                st.error("Submission not found.")
-                return
-            text = target_entry["extracted_text"]
-            if not text or len(text) < 50:
-                st.warning("Could not extract sufficient text from the selected submission.")
-                return
-            set1 = set(split_into_sentences(text.lower()))
-            other_entries = [entry for entry in db if entry["roll_no"] != selected_roll]
-            matches = []
-            for entry in other_entries:
-                other_text = entry["extracted_text"]
-                if not other_text or len(other_text) < 50:
-                    continue
-                set2 = set(split_into_sentences(other_text.lower()))
-                jaccard_sim = len(set1 & set2) / len(set1 | set2) if set1 | set2 else 0.0
-                score = int(jaccard_sim * 100)
-                if score >= threshold:
-                    matches.append({
-                        "roll_no": entry["roll_no"],
-                        "name": entry["name"],
-                        "score": score
-                    })
-            if not matches:
-                st.warning("No significant plagiarism detected above the threshold. Try lowering the threshold if you expect a match.")
-            else:
-                best_match = max(matches, key=lambda x: x["score"])
-                st.subheader("Most Similar Submission (Sentence Level)")
-                st.write(f"Roll No: {best_match['roll_no']} | Name: {best_match['name']} | Score: {best_match['score']}%")
-                st.info(f"Showing only the most similar match with score ≥ {threshold}")
+        store = open_store()
+        try:
+            check_plagiarism(store)
+        finally:
+            store.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,13 +1,17 @@
 import streamlit as st
 import re
-from PyPDF2 import PdfReader
-import docx
-from pptx import Presentation
 from fpdf import FPDF
 import speech_recognition as sr
 from groq import Groq
 from dotenv import load_dotenv
 import os
+import time
+from utils.buddy.answer_cache import (IN_FLIGHT_TIMEOUT, answer_key, document_hash, get_answer_cache,
+                                     in_flight, normalize_question)
+from utils.buddy.notes import chunk_document, chunk_prompt, map_chunks, merge_notes
+from utils.buddy.retrieval import PassageIndex
+from utils.extraction_cache import document_key, get_extraction_cache
+from utils.streaming import groq_deltas, record_latency, timed_stream
 
 # Load Groq API key from .env
 load_dotenv()
@@ -16,6 +20,7 @@ if not GROQ_API_KEY:
     st.error("GROQ_API not set in .env file")
     st.stop()
 groq_client = Groq(api_key=GROQ_API_KEY)
+CHAT_MODEL = "llama-3.1-8b-instant"
 
 # --- Notes Generator Prompt ---
 NOTES_GENERATOR_PROMPT = """
@@ -47,29 +52,14 @@ You are an AI-powered study buddy specializing in generating detailed, exam-orie
    * The output should be suitable for direct use as exam revision notes.
 """
 
-# --- File extraction ---
+# --- File extraction (parsed once per file content for all users, see utils/extraction_cache.py) ---
 def extract_pdf(file):
-    # Return a list of page texts, but also debug log the length and preview
+    # Return a list of page texts, logging the page count and a preview of the first page
     pages = []
     try:
-        # Save uploaded file to disk for PyPDF2 compatibility
-        import tempfile
-        file.seek(0)
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-            tmp.write(file.read())
-            tmp.flush()
-            tmp_path = tmp.name
-        file.seek(0)
-        reader = PdfReader(tmp_path)
-        for i, page in enumerate(reader.pages):
-            text = page.extract_text()
-            st.info(f"Page {i+1} extracted text length: {len(text) if text else 0}")
-            if text:
-                pages.append(text)
-            else:
-                pages.append('')
+        pages = get_extraction_cache().extract(file.getvalue(), "pdf_pages")
         if not pages or all(not p.strip() for p in pages):
-            st.warning(f"PDF extraction: All pages empty. (Total pages: {len(reader.pages)})")
+            st.warning(f"PDF extraction: All pages empty. (Total pages: {len(pages)})")
         else:
             st.info(f"PDF extraction: {len(pages)} pages, first page preview: {repr(pages[0][:100]) if pages[0] else 'EMPTY'}")
     except Exception as e:
@@ -77,12 +67,10 @@ def extract_pdf(file):
     return pages
 
 def extract_docx(file):
-    return [p.text for p in docx.Document(file).paragraphs if p.text.strip()]
+    return get_extraction_cache().extract(file.getvalue(), "docx_paragraphs")
 
 def extract_pptx(file):
-    return [shape.text.strip() for slide in Presentation(file).slides
-            for shape in slide.shapes
-            if hasattr(shape, 'text') and shape.text.strip()]
+    return get_extraction_cache().extract(file.getvalue(), "pptx_texts")
 
 # --- AI-powered Document Chat and Notes using Groq ---
 class DocumentUnderstanding:
@@ -91,18 +79,29 @@ class DocumentUnderstanding:
         self.notes_pointer = 0
         self.notes_chunks = []
         self.last_notes_output = ""
+        self.passage_index = None
+        self.passage_index_text = ""
+        self.passage_paged = False  # passages carry real page numbers (PDFs only)
+        self.last_answer_stats = None
+        self.last_notes_stats = None
 
     def save_to_session(self):
         st.session_state['docu_full_text'] = self.full_text
         st.session_state['docu_notes_pointer'] = self.notes_pointer
         st.session_state['docu_notes_chunks'] = self.notes_chunks
         st.session_state['docu_last_notes_output'] = self.last_notes_output
+        st.session_state['docu_passage_index'] = self.passage_index
+        st.session_state['docu_passage_index_text'] = self.passage_index_text
+        st.session_state['docu_passage_paged'] = self.passage_paged
 
     def load_from_session(self):
         self.full_text = st.session_state.get('docu_full_text', "")
         self.notes_pointer = st.session_state.get('docu_notes_pointer', 0)
         self.notes_chunks = st.session_state.get('docu_notes_chunks', [])
         self.last_notes_output = st.session_state.get('docu_last_notes_output', "")
+        self.passage_index = st.session_state.get('docu_passage_index')
+        self.passage_index_text = st.session_state.get('docu_passage_index_text', "")
+        self.passage_paged = st.session_state.get('docu_passage_paged', False)
 
     @property
     def notes_confirmed(self):
@@ -113,7 +112,8 @@ class DocumentUnderstanding:
     def notes_confirmed(self, value):
         st.session_state['notes_confirmed'] = value
 
-    def process_document(self, pages):
+    def process_document(self, pages, paged=True):
+        # paged: pages are real pages (PDF); DOCX paragraphs and PPTX shapes are indexed as one text
         # Join with newlines to preserve paragraph/topic structure for splitting
         # Also debug log the number of non-empty pages and preview
         non_empty_pages = [p for p in pages if p and p.strip()]
@@ -123,13 +123,27 @@ class DocumentUnderstanding:
         self.notes_chunks = self._split_topics_for_notes()
         self.notes_confirmed = False
         self.last_notes_output = ""
+        # Indexed once here; each question then retrieves only the passages it needs
+        self.passage_index = PassageIndex(pages if paged else [self.full_text])
+        self.passage_index_text = self.full_text
+        self.passage_paged = paged
         self.save_to_session()
 
+    def _get_passage_index(self):
+        # Board photos and reloaded library documents set full_text directly, without process_document
+        if self.passage_index is None or self.passage_index_text != self.full_text:
+            self.passage_index = PassageIndex([self.full_text])
+            self.passage_index_text = self.full_text
+            self.passage_paged = False
+            self.save_to_session()
+        return self.passage_index
+
     def _split_topics_for_notes(self):
-        # No chunking needed, just return the whole document as one topic
-        return [["Entire Document"]]
+        # Sections at the document's headings, packed into chunks that fit one notes prompt
+        return chunk_document(self.full_text)
 
-    def generate_notes(self, confirm=False, continue_notes=False):
+    def generate_notes(self, confirm=False, continue_notes=False, on_progress=None):
+        # on_progress(done, total, partial_notes) is called as each chunk's notes arrive
         # Always reload state from session to persist across reruns
         self.load_from_session()
         # Debug: show full_text length and preview
@@ -137,34 +151,96 @@ class DocumentUnderstanding:
             return "No document content available to generate notes. (Debug: full_text is empty)"
         if len(self.full_text) < 30:
             return f"No document content available to generate notes. (Debug: full_text too short: {repr(self.full_text[:100])})"
-        # No confirmation or chunking, just generate all notes in one go
-        prompt = NOTES_GENERATOR_PROMPT + "\n\nDocument Content:\n" + self.full_text[:12000]
-        try:
-            chat_completion = groq_client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model="llama-3.1-8b-instant",
+        # Map: notes for every chunk of the document, concurrently; reduce: merged in document order
+        self.notes_chunks = self._split_topics_for_notes()
+        chunks = self.notes_chunks
+
+        def generate(index, chunk, on_text):
+            stream = groq_client.chat.completions.create(
+                messages=[{"role": "user", "content": chunk_prompt(NOTES_GENERATOR_PROMPT, chunk, index, len(chunks))}],
+                model=CHAT_MODEL,
+                stream=True,
             )
-            self.last_notes_output = chat_completion.choices[0].message.content.strip()
-            self.save_to_session()
-            return self.last_notes_output
-        except Exception as e:
-            st.error(f"Groq API error: {e}")
+            text = ""
+            for delta in timed_stream(groq_deltas(stream), "notes_chunk", model=CHAT_MODEL):
+                text += delta
+                on_text(text)
+            return text.strip()
+
+        # Tokens stream into every chunk's notes at once; each snapshot re-renders the merged notes
+        start = time.perf_counter()
+        stats = {"chunks": len(chunks)}
+        notes, errors = {}, {}
+        for partial, errors, done in map_chunks(chunks, generate):
+            if "ttft_s" not in stats and any(partial.values()):
+                stats["ttft_s"] = time.perf_counter() - start
+            notes = {**partial, **{index: f"_Notes for this part could not be generated ({error})._"
+                                   for index, error in errors.items()}}
+            if on_progress:
+                on_progress(done, len(chunks), merge_notes(chunks, notes))
+        stats["total_s"] = time.perf_counter() - start
+        record_latency("notes", stats, CHAT_MODEL)
+        self.last_notes_stats = stats
+        if len(errors) == len(chunks):
+            st.error(f"Groq API error: {next(iter(errors.values()))}")
             return "Could not generate notes. Please try again."
+        if errors:
+            st.warning(f"Notes for {len(errors)} of {len(chunks)} parts could not be generated.")
+        self.last_notes_output = merge_notes(chunks, notes)
+        self.save_to_session()
+        return self.last_notes_output
 
-    def answer_question(self, question):
+    def answer_question(self, question, render=None):
+        # render(deltas) shows the answer while it streams and returns the full text, like st.write_stream
+        self.last_answer_stats = None
         if not self.full_text.strip():
             return "No document content available to answer questions."
+        # Answers are shared by every session asking about the same document
+        doc_hash = document_hash(self.full_text)
+        cached = get_answer_cache().get(doc_hash, question, CHAT_MODEL)
+        if cached is None:
+            key = answer_key(doc_hash, question, CHAT_MODEL)
+            waiting = in_flight.begin(key)
+            if waiting is None:
+                try:
+                    return self._answer_uncached(question, doc_hash, render)
+                finally:
+                    in_flight.end(key)
+            # Another session is asking the same question right now; its answer will be cached
+            waiting.wait(IN_FLIGHT_TIMEOUT)
+            cached = get_answer_cache().get(doc_hash, question, CHAT_MODEL)
+            if cached is None:
+                return self._answer_uncached(question, doc_hash, render)
+        answer, cached_question = cached
+        self.last_answer_stats = {"cached": True, "cached_question": cached_question}
+        return render([answer]) if render else answer
+
+    def _answer_uncached(self, question, doc_hash, render):
         try:
+            passages = self._get_passage_index().search(question)
+            paged = self.passage_paged and len({passage["page"] for passage in passages}) > 1
+            context = "\n\n".join(
+                f"[Page {passage['page']}] {passage['text']}" if paged else passage["text"] for passage in passages
+            )
             prompt = (
-                "You are an expert assistant. Answer the user's question using ONLY the following document content. "
+                "You are an expert assistant. Answer the user's question using ONLY the following document excerpts. "
                 "If the answer is not present, say so.\n\n"
-                f"Document Content:\n{self.full_text[:12000]}\n\nQuestion: {question}\nAnswer:"
+                f"Document Excerpts:\n{context}\n\nQuestion: {question}\nAnswer:"
             )
-            chat_completion = groq_client.chat.completions.create(
+            stats = {"passages": len(passages)}
+            if self.passage_paged:
+                stats["pages"] = sorted({passage["page"] for passage in passages})
+            stream = groq_client.chat.completions.create(
                 messages=[{"role": "user", "content": prompt}],
-                model="llama-3.1-8b-instant",
+                model=CHAT_MODEL,
+                stream=True,
             )
-            return chat_completion.choices[0].message.content.strip()
+            deltas = timed_stream(groq_deltas(stream, stats), "chat", stats, CHAT_MODEL)
+            answer = render(deltas) if render else "".join(deltas)
+            self.last_answer_stats = stats
+            if stats.get("completed"):
+                get_answer_cache().put(doc_hash, question, CHAT_MODEL, answer.strip())
+            return answer.strip()
         except Exception as e:
             st.error(f"Groq API error: {e}")
             return "Could not generate an answer. Please try a different question."
@@ -209,7 +285,9 @@ with tab1:
     if input_method == "Upload PDF/DOCX/PPTX":
         uploaded_file = st.file_uploader("Upload PDF/DOCX/PPTX", type=["pdf", "docx", "pptx"])
         if uploaded_file:
-            if uploaded_file.name not in st.session_state.library:
+            # Keyed by content, so a renamed copy is recognised and a changed file with the same name is not
+            library_key = document_key(uploaded_file.getvalue())
+            if library_key not in st.session_state.library:
                 with st.spinner(":material/text_compare: Analyzing document..."):
                     try:
                         if uploaded_file.type == "application/pdf":
@@ -221,28 +299,40 @@ with tab1:
                         else:
                             st.error("Unsupported file type")
                             st.stop()
-                        st.session_state.document_understanding.process_document(pages)
-                        st.session_state.library[uploaded_file.name] = pages
+                        st.session_state.document_understanding.process_document(
+                            pages, paged=uploaded_file.type == "application/pdf"
+                        )
+                        st.session_state.library[library_key] = {"name": uploaded_file.name, "pages": pages}
                         extracted_text = st.session_state.document_understanding.full_text
                     except Exception as e:
                         st.error(f"Error processing document: {e}")
                         st.stop()
             else:
-                # Already processed, just load text
-                extracted_text = "\n".join(st.session_state.library[uploaded_file.name])
+                # Already processed, just load text (joined as in process_document, so caches keyed on it still match)
+                extracted_text = "\n".join(p for p in st.session_state.library[library_key]["pages"] if p and p.strip())
     elif input_method == "Take Board Photo":
         enable_camera = st.checkbox(":material/camera: Enable camera")
         picture = st.camera_input("Take a picture of the classroom board", disabled=not enable_camera)
-        if picture:
-            st.image(picture, caption="Board Photo", use_container_width=True)
+        board_uploads = st.file_uploader("Or upload photos of the board/notes", type=["png", "jpg", "jpeg"], accept_multiple_files=True)
+        photos = ([picture] if picture else []) + list(board_uploads or [])
+        if photos:
             import tempfile
-            temp_img_path = None
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp_img:
-                tmp_img.write(picture.getvalue())
-                temp_img_path = tmp_img.name
+            from utils.plag.ocr_pool import ocr_chunks
+            for photo in photos:
+                st.image(photo, caption="Board Photo", use_container_width=True)
             try:
-                from utils.plag.vision import extract_text_from_image
-                extracted_text = extract_text_from_image(temp_img_path)
+                # The photos only live on disk while they are OCR'd
+                with tempfile.TemporaryDirectory() as photo_dir:
+                    photo_paths = []
+                    for number, photo in enumerate(photos):
+                        path = os.path.join(photo_dir, f"{number}{os.path.splitext(photo.name)[1] or '.png'}")
+                        with open(path, "wb") as f:
+                            f.write(photo.getvalue())
+                        photo_paths.append(path)
+                    # Batched vision requests under the same rate limit and retries as submission OCR;
+                    # handwriting on a board needs the vision model, whatever OCR_BACKEND says
+                    texts = ocr_chunks(photo_paths, policy="remote")
+                extracted_text = "\n\n".join(texts)
                 st.success("Text extracted from board photo!")
                 st.text_area("Extracted Text", extracted_text, height=200)
             except Exception as e:
@@ -254,9 +344,20 @@ with tab1:
         docu.full_text = extracted_text
         docu.save_to_session()
         if st.button("Generate Notes!"):
-            notes_output = docu.generate_notes()
+            progress = st.progress(0.0, text="Generating notes...")
+            partial_notes = st.empty()
+
+            def show_progress(done, total, notes):
+                progress.progress(done / total, text=f"Notes for {done} of {total} parts ready...")
+                partial_notes.markdown(notes)
+
+            notes_output = docu.generate_notes(on_progress=show_progress)
+            progress.empty()
             st.session_state['last_notes_output'] = notes_output
-            st.markdown(notes_output)
+            partial_notes.markdown(notes_output)
+            if docu.last_notes_stats and "ttft_s" in docu.last_notes_stats:
+                st.caption(f"First notes after {docu.last_notes_stats['ttft_s']:.1f}s, "
+                           f"all {docu.last_notes_stats['chunks']} parts in {docu.last_notes_stats['total_s']:.1f}s")
         elif 'last_notes_output' in st.session_state:
             st.markdown(st.session_state['last_notes_output'])
 
@@ -304,7 +405,7 @@ with tab2:
     # Always reload document state for chat tab as well
     st.session_state.document_understanding.load_from_session()
     if st.session_state.library:
-        doc_names = list(st.session_state.library.keys())
+        doc_names = [document["name"] for document in st.session_state.library.values()]
     col1, col2 = st.columns([0.92, 0.08], vertical_alignment="bottom", gap="small")
     with col2:
         if st.button(":material/mic:"):
@@ -313,14 +414,45 @@ with tab2:
                 st.session_state.last_question = query
     with col1:
         query_text = st.text_input(label="", placeholder="Ask Anything", value=st.session_state.get('last_question', ''))
-    if query_text:
-        st.session_state.messages.append({"role": "user", "content": query_text})
+    with st.container(border=True):
+        history = st.session_state.messages[-5:]
+        # The text input keeps its value across reruns; the ledger stops a rerun from asking again
+        ledger = st.session_state.setdefault("chat_ledger", set())
         # Ensure document_understanding is loaded with latest session state
         st.session_state.document_understanding.load_from_session()
-        answer = st.session_state.document_understanding.answer_question(query_text)
-        formatted_answer = f"From the document:\n\n{answer}"
-        st.session_state.messages.append({"role": "assistant", "content": formatted_answer})
-    with st.container(border=True):
-        for message in reversed(st.session_state.messages[-5:]):
+        ledger_entry = (document_hash(st.session_state.document_understanding.full_text), normalize_question(query_text))
+        if query_text and ledger_entry not in ledger:
+            st.session_state.messages.append({"role": "user", "content": query_text})
+            # The new answer streams in at the top, above the earlier messages
+            with st.chat_message("assistant"):
+                st.markdown("From the document:")
+                answer = st.session_state.document_understanding.answer_question(query_text, render=st.write_stream)
+                message = {"role": "assistant", "content": f"From the document:\n\n{answer}"}
+                stats = st.session_state.document_understanding.last_answer_stats
+                if stats is not None:
+                    # Only answered questions go into the ledger, so a failed one can be asked again
+                    ledger.add(ledger_entry)
+                if stats is None:
+                    # Nothing was streamed: no document, or the request failed
+                    st.markdown(answer)
+                elif stats.get("cached"):
+                    message["caption"] = "Answered before" + (
+                        f" as “{stats['cached_question']}”" if stats["cached_question"] != ledger_entry[1] else ""
+                    ) + " · served from the answer cache"
+                    st.caption(message["caption"])
+                else:
+                    # Only PDF passages have page numbers; DOCX and PPTX passages are not cited by page
+                    pages = f" (pages {', '.join(map(str, stats['pages']))})" if "pages" in stats else ""
+                    message["caption"] = (
+                        f"{stats['passages']} passages{pages} · "
+                        f"{stats.get('prompt_tokens')} prompt tokens · first token {stats.get('ttft_s', 0):.1f}s · "
+                        f"total {stats['total_s']:.1f}s"
+                    )
+                    st.caption(message["caption"])
+            st.session_state.messages.append(message)
+            history = st.session_state.messages[-5:-1]
+        for message in reversed(history):
             with st.chat_message(message["role"]):
-                st.markdown(message["content"])
\ No newline at end of file
+                st.markdown(message["content"])
+                if message.get("caption"):
+                    st.caption(message["caption"])
\ No newline at end of file